@@ -27,53 +27,128 @@
 
 import sys
 import ctypes
+import importlib.util
 import struct
+from array import array
+from itertools import compress
 from ctypes import *
 
 if not hasattr(ctypes, "c_bool"):   # for Python < 2.6
     c_bool = c_uint8
 
-try:  #import NumPy if available
-    import numpy
-    numpy_available = True
-except ImportError:
-    numpy_available = False
+# NumPy is used if available, but only imported on first use
+numpy_available = importlib.util.find_spec('numpy') is not None
+
+class _LazyNumpy:
+    def __getattr__(self, name):
+        global numpy
+        import numpy
+        return getattr(numpy, name)
+
+numpy = _LazyNumpy()
 
 LINUX=False
 MAC=False
+HAIKU=False
 MINGW=False
 MSVC=False
 if sys.platform.find('linux') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
     LINUX=True
 elif sys.platform.find('darwin') != -1:
-    _lib = ctypes.cdll['./libtcod.dylib']
     MAC = True
 elif sys.platform.find('haiku') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
     HAIKU = True
-else:
-    try:
-        _lib = ctypes.cdll['./libtcod-mingw.dll']
-        MINGW=True
-    except WindowsError:
-        _lib = ctypes.cdll['./libtcod-VS.dll']
-        MSVC=True
-    # On Windows, ctypes doesn't work well with function returning structs,
-    # so we have to user the _wrapper functions instead
-    _lib.TCOD_color_multiply = _lib.TCOD_color_multiply_wrapper
-    _lib.TCOD_color_add = _lib.TCOD_color_add_wrapper
-    _lib.TCOD_color_multiply_scalar = _lib.TCOD_color_multiply_scalar_wrapper
-    _lib.TCOD_color_subtract = _lib.TCOD_color_subtract_wrapper
-    _lib.TCOD_color_lerp = _lib.TCOD_color_lerp_wrapper
-    _lib.TCOD_console_get_default_background = _lib.TCOD_console_get_default_background_wrapper
-    _lib.TCOD_console_get_default_foreground = _lib.TCOD_console_get_default_foreground_wrapper
-    _lib.TCOD_console_get_char_background = _lib.TCOD_console_get_char_background_wrapper
-    _lib.TCOD_console_get_char_foreground = _lib.TCOD_console_get_char_foreground_wrapper
-    _lib.TCOD_console_get_fading_color = _lib.TCOD_console_get_fading_color_wrapper
-    _lib.TCOD_image_get_pixel = _lib.TCOD_image_get_pixel_wrapper
-    _lib.TCOD_image_get_mipmap_pixel = _lib.TCOD_image_get_mipmap_pixel_wrapper
-    _lib.TCOD_parser_get_color_property = _lib.TCOD_parser_get_color_property_wrapper
+
+# On Windows, ctypes doesn't work well with function returning structs,
+# so we have to user the _wrapper functions instead
+_WINDOWS_WRAPPERS = frozenset([
+    'TCOD_color_multiply', 'TCOD_color_add', 'TCOD_color_multiply_scalar',
+    'TCOD_color_subtract', 'TCOD_color_lerp',
+    'TCOD_console_get_default_background', 'TCOD_console_get_default_foreground',
+    'TCOD_console_get_char_background', 'TCOD_console_get_char_foreground',
+    'TCOD_console_get_fading_color',
+    'TCOD_image_get_pixel', 'TCOD_image_get_mipmap_pixel',
+    'TCOD_parser_get_color_property',
+])
+
+class _Prototype:
+    # collects the attributes set on a function, such as restype and argtypes.
+    def __init__(self, attributes):
+        self.__dict__['_attributes'] = attributes
+
+    def __setattr__(self, name, value):
+        self._attributes[name] = value
+
+class _PrototypeRecorder:
+    # stands in for the library in cprotos.setup_protos, recording the
+    # prototypes it sets so they are only applied to the functions used.
+    def __init__(self, prototypes):
+        self.__dict__['_prototypes'] = prototypes
+
+    def __getattr__(self, name):
+        return _Prototype(self._prototypes.setdefault(name, {}))
+
+class _LazyLib:
+    # stands in for the native library, which is only loaded on the first
+    # native call. Every function is looked up once, gets the prototype
+    # registered for it with prototypes and is then cached as an attribute,
+    # so later calls don't go through __getattr__ anymore.
+    def __init__(self):
+        self._dll = None
+        self._prototypes = {}
+
+    def prototypes(self, **restypes):
+        # registers the restype of the functions of a subsystem.
+        for name, restype in restypes.items():
+            self._prototypes.setdefault(name, {})['restype'] = restype
+
+    def load(self):
+        # loads the native library, done by the first native call.
+        global MINGW, MSVC
+        if self._dll is not None:
+            return self._dll
+
+        if LINUX or HAIKU:
+            dll = ctypes.cdll['./libtcod.so']
+        elif MAC:
+            dll = ctypes.cdll['./libtcod.dylib']
+        else:
+            try:
+                dll = ctypes.cdll['./libtcod-mingw.dll']
+                MINGW=True
+            except WindowsError:
+                dll = ctypes.cdll['./libtcod-VS.dll']
+                MSVC=True
+
+        # Should be valid on any platform, check it!
+        if MAC:
+            from cprotos import setup_protos
+            recorded = {}
+            setup_protos(_PrototypeRecorder(recorded))
+            # the prototypes registered here win, as they used to be set last
+            for name, attributes in self._prototypes.items():
+                recorded.setdefault(name, {}).update(attributes)
+            self._prototypes = recorded
+
+        self._dll = dll
+        return dll
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        dll = self.load()
+        if not (LINUX or MAC or HAIKU) and name in _WINDOWS_WRAPPERS:
+            function = getattr(dll, name + '_wrapper')
+        else:
+            function = getattr(dll, name)
+
+        for attribute, value in self._prototypes.get(name, {}).items():
+            setattr(function, attribute, value)
+        setattr(self, name, function)
+        return function
+
+_lib = _LazyLib()
 
 HEXVERSION = 0x010502
 STRVERSION = "1.5.2"
@@ -123,16 +198,13 @@ class Color(Structure):
         yield self.g
         yield self.b
 
-# Should be valid on any platform, check it!  Has to be done after Color is defined.
-if MAC:
-    from cprotos import setup_protos
-    setup_protos(_lib)
-
-_lib.TCOD_color_equals.restype = c_bool
-_lib.TCOD_color_multiply.restype = Color
-_lib.TCOD_color_multiply_scalar.restype = Color
-_lib.TCOD_color_add.restype = Color
-_lib.TCOD_color_subtract.restype = Color
+_lib.prototypes(
+    TCOD_color_equals=c_bool,
+    TCOD_color_multiply=Color,
+    TCOD_color_multiply_scalar=Color,
+    TCOD_color_add=Color,
+    TCOD_color_subtract=Color,
+)
 
 # default colors
 # grey levels
@@ -357,7 +429,9 @@ celadon=Color(172,255,175)
 peach=Color(255,159,127)
 
 # color functions
-_lib.TCOD_color_lerp.restype = Color
+_lib.prototypes(
+    TCOD_color_lerp=Color,
+)
 def color_lerp(c1, c2, a):
     return _lib.TCOD_color_lerp(c1, c2, c_float(a))
 
@@ -464,8 +538,6 @@ class ConsoleBuffer:
             console_get_height(dest) != self.height):
             raise ValueError('ConsoleBuffer.blit: Destination console has an incorrect size.')
 
-        s = struct.Struct('%di' % len(self.back_r))
-
         if fill_back:
             _lib.TCOD_console_fill_background(dest, (c_int * len(self.back_r))(*self.back_r), (c_int * len(self.back_g))(*self.back_g), (c_int * len(self.back_b))(*self.back_b))
 
@@ -473,17 +545,197 @@ class ConsoleBuffer:
             _lib.TCOD_console_fill_foreground(dest, (c_int * len(self.fore_r))(*self.fore_r), (c_int * len(self.fore_g))(*self.fore_g), (c_int * len(self.fore_b))(*self.fore_b))
             _lib.TCOD_console_fill_char(dest, (c_int * len(self.char))(*self.char))
 
-_lib.TCOD_console_credits_render.restype = c_bool
-_lib.TCOD_console_is_fullscreen.restype = c_bool
-_lib.TCOD_console_is_window_closed.restype = c_bool
-_lib.TCOD_console_has_mouse_focus.restype = c_bool
-_lib.TCOD_console_is_active.restype = c_bool
-_lib.TCOD_console_get_default_background.restype = Color
-_lib.TCOD_console_get_default_foreground.restype = Color
-_lib.TCOD_console_get_char_background.restype = Color
-_lib.TCOD_console_get_char_foreground.restype = Color
-_lib.TCOD_console_get_fading_color.restype = Color
-_lib.TCOD_console_is_key_pressed.restype = c_bool
+class ArrayConsoleBuffer:
+    # ConsoleBuffer kept in one contiguous array of ints, one plane of
+    # width * height cells per channel in the order of PLANES. blit hands the
+    # planes to libtcod's "fill" functions by pointer, without copying them.
+    PLANES = ('back_r', 'back_g', 'back_b', 'fore_r', 'fore_g', 'fore_b', 'char')
+
+    def __init__(self, width, height, back_r=0, back_g=0, back_b=0, fore_r=0, fore_g=0, fore_b=0, char=' '):
+        self.width = width
+        self.height = height
+        self.data = array('i', bytes(4 * len(self.PLANES) * width * height))
+        self.clear(back_r, back_g, back_b, fore_r, fore_g, fore_b, char)
+
+    def plane(self, name):
+        # returns the (offset, end) of the plane of given name inside data.
+        n = self.width * self.height
+        start = self.PLANES.index(name) * n
+        return start, start + n
+
+    def clear(self, back_r=0, back_g=0, back_b=0, fore_r=0, fore_g=0, fore_b=0, char=' '):
+        # fills every plane with a single value, in place.
+        n = self.width * self.height
+        for i, value in enumerate((back_r, back_g, back_b, fore_r, fore_g, fore_b, ord(char))):
+            self.data[i * n:(i + 1) * n] = array('i', [value]) * n
+
+    def copy(self):
+        # returns a copy of this buffer, a single copy of the underlying array.
+        other = ArrayConsoleBuffer.__new__(ArrayConsoleBuffer)
+        other.width = self.width
+        other.height = self.height
+        other.data = array('i', self.data)
+        return other
+
+    def _values(self, back=None, fore=None, char=None):
+        # returns the (plane index, value) pairs to write for the given colors and char.
+        values = []
+        if back is not None:
+            values += [(0, back[0]), (1, back[1]), (2, back[2])]
+        if fore is not None:
+            values += [(3, fore[0]), (4, fore[1]), (5, fore[2])]
+        if char is not None:
+            values.append((6, ord(char) if type(char) in (str, bytes) else char))
+        return values
+
+    def set_rect(self, x, y, w, h, back=None, fore=None, char=None):
+        # sets the (r, g, b) background, foreground and/or char of every cell
+        # of a rectangle, one slice assignment per row and plane.
+        n = self.width * self.height
+        x2, y2 = min(x + w, self.width), min(y + h, self.height)
+        x, y = max(x, 0), max(y, 0)
+        if x >= x2 or y >= y2:
+            return
+        for plane, value in self._values(back, fore, char):
+            row = array('i', [value]) * (x2 - x)
+            for cy in range(y, y2):
+                i = plane * n + cy * self.width
+                self.data[i + x:i + x2] = row
+
+    def set_row(self, y, back=None, fore=None, char=None, x=0):
+        # sets the cells of row y from x on. back and fore are sequences of
+        # (r, g, b), char a string or a sequence of character codes, all of the same length.
+        # Values falling outside of the row or the buffer are dropped.
+        if not 0 <= y < self.height:
+            return
+        n = self.width * self.height
+        skip = max(-x, 0)
+        x += skip
+        start = y * self.width + x
+
+        def write(plane, values):
+            values = values[skip:skip + max(self.width - x, 0)]
+            self.data[plane * n + start:plane * n + start + len(values)] = array('i', values)
+
+        if back is not None:
+            for plane, values in enumerate(zip(*back)):
+                write(plane, values)
+        if fore is not None:
+            for plane, values in enumerate(zip(*fore), 3):
+                write(plane, values)
+        if char is not None:
+            write(6, [ord(c) for c in char] if type(char) == str else list(char))
+
+    def set_mask(self, mask, back=None, fore=None, char=None):
+        # sets the cells where mask, a sequence of width * height booleans, is true.
+        n = self.width * self.height
+        values = self._values(back, fore, char)
+        if numpy_available:
+            mask = numpy.asarray(mask, dtype=bool).reshape(n)
+            planes = numpy.frombuffer(self.data, dtype=numpy.intc).reshape(len(self.PLANES), n)
+            for plane, value in values:
+                planes[plane][mask] = value
+        else:
+            cells = list(compress(range(n), mask))
+            for plane, value in values:
+                for i in cells:
+                    self.data[plane * n + i] = value
+
+    def set_fore(self, x, y, r, g, b, char):
+        # set the character and foreground color of one cell.
+        n = self.width * self.height
+        i = self.width * y + x
+        self.data[3 * n + i] = r
+        self.data[4 * n + i] = g
+        self.data[5 * n + i] = b
+        self.data[6 * n + i] = ord(char)
+
+    def set_back(self, x, y, r, g, b):
+        # set the background color of one cell.
+        n = self.width * self.height
+        i = self.width * y + x
+        self.data[i] = r
+        self.data[n + i] = g
+        self.data[2 * n + i] = b
+
+    def set(self, x, y, back_r, back_g, back_b, fore_r, fore_g, fore_b, char):
+        # set the background color, foreground color and character of one cell.
+        self.set_back(x, y, back_r, back_g, back_b)
+        self.set_fore(x, y, fore_r, fore_g, fore_b, char)
+
+    def get(self, x, y):
+        # returns the (back_r, back_g, back_b, fore_r, fore_g, fore_b, char) of one cell.
+        n = self.width * self.height
+        i = self.width * y + x
+        return tuple(self.data[plane * n + i] for plane in range(len(self.PLANES)))
+
+    def blit(self, dest, fill_fore=True, fill_back=True):
+        # write the buffer to a console, or to a StandInConsole, without copying it.
+        if isinstance(dest, StandInConsole):
+            size = (dest.width, dest.height)
+            fill_background, fill_foreground, fill_char = dest.fill_background, dest.fill_foreground, dest.fill_char
+        else:
+            size = (console_get_width(dest), console_get_height(dest))
+            fill_background = lambda r, g, b: _lib.TCOD_console_fill_background(dest, r, g, b)
+            fill_foreground = lambda r, g, b: _lib.TCOD_console_fill_foreground(dest, r, g, b)
+            fill_char = lambda c: _lib.TCOD_console_fill_char(dest, c)
+
+        if size != (self.width, self.height):
+            raise ValueError('ArrayConsoleBuffer.blit: Destination console has an incorrect size.')
+
+        # ctypes arrays sharing the memory of each plane
+        n = self.width * self.height
+        planes = [(c_int * n).from_buffer(self.data, i * n * self.data.itemsize) for i in range(len(self.PLANES))]
+
+        if fill_back:
+            fill_background(planes[0], planes[1], planes[2])
+
+        if fill_fore:
+            fill_foreground(planes[3], planes[4], planes[5])
+            fill_char(planes[6])
+
+class StandInConsole:
+    # a console kept in memory, accepted by ArrayConsoleBuffer.blit in place of
+    # a native console, so buffers can be used and tested without libtcod.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        n = width * height
+        self.back = [(0, 0, 0)] * n
+        self.fore = [(0, 0, 0)] * n
+        self.char = [ord(' ')] * n
+
+    def fill_background(self, r, g, b):
+        self.back = list(zip(r, g, b))
+
+    def fill_foreground(self, r, g, b):
+        self.fore = list(zip(r, g, b))
+
+    def fill_char(self, arr):
+        self.char = list(arr)
+
+    def get_char_background(self, x, y):
+        return self.back[y * self.width + x]
+
+    def get_char_foreground(self, x, y):
+        return self.fore[y * self.width + x]
+
+    def get_char(self, x, y):
+        return self.char[y * self.width + x]
+
+_lib.prototypes(
+    TCOD_console_credits_render=c_bool,
+    TCOD_console_is_fullscreen=c_bool,
+    TCOD_console_is_window_closed=c_bool,
+    TCOD_console_has_mouse_focus=c_bool,
+    TCOD_console_is_active=c_bool,
+    TCOD_console_get_default_background=Color,
+    TCOD_console_get_default_foreground=Color,
+    TCOD_console_get_char_background=Color,
+    TCOD_console_get_char_foreground=Color,
+    TCOD_console_get_fading_color=Color,
+    TCOD_console_is_key_pressed=c_bool,
+)
 
 # background rendering modes
 BKGND_NONE = 0
@@ -980,8 +1232,10 @@ def console_save_apf(con, filename) :
 ############################
 # sys module
 ############################
-_lib.TCOD_sys_get_last_frame_length.restype = c_float
-_lib.TCOD_sys_elapsed_seconds.restype = c_float
+_lib.prototypes(
+    TCOD_sys_get_last_frame_length=c_float,
+    TCOD_sys_elapsed_seconds=c_float,
+)
 
 # high precision time functions
 def sys_set_fps(fps):
@@ -1058,9 +1312,11 @@ def sys_wait_for_event(mask,k,m,flush) :
 ############################
 # line module
 ############################
-_lib.TCOD_line_step.restype = c_bool
-_lib.TCOD_line.restype=c_bool
-_lib.TCOD_line_step_mt.restype = c_bool
+_lib.prototypes(
+    TCOD_line_step=c_bool,
+    TCOD_line=c_bool,
+    TCOD_line_step_mt=c_bool,
+)
 
 def line_init(xo, yo, xd, yd):
     _lib.TCOD_line_init(xo, yo, xd, yd)
@@ -1091,9 +1347,11 @@ def line_iter(xo, yo, xd, yd):
 ############################
 # image module
 ############################
-_lib.TCOD_image_is_pixel_transparent.restype = c_bool
-_lib.TCOD_image_get_pixel.restype = Color
-_lib.TCOD_image_get_mipmap_pixel.restype = Color
+_lib.prototypes(
+    TCOD_image_is_pixel_transparent=c_bool,
+    TCOD_image_get_pixel=Color,
+    TCOD_image_get_mipmap_pixel=Color,
+)
 
 def image_new(width, height):
     return _lib.TCOD_image_new(width, height)
@@ -1188,7 +1446,9 @@ class Mouse(Structure):
               ('wheel_down', c_bool),
               ]
 
-_lib.TCOD_mouse_is_cursor_visible.restype = c_bool
+_lib.prototypes(
+    TCOD_mouse_is_cursor_visible=c_bool,
+)
 
 def mouse_show_cursor(visible):
     _lib.TCOD_mouse_show_cursor(c_int(visible))
@@ -1207,13 +1467,15 @@ def mouse_get_status():
 ############################
 # parser module
 ############################
-_lib.TCOD_struct_get_name.restype = c_char_p
-_lib.TCOD_struct_is_mandatory.restype = c_bool
-_lib.TCOD_parser_has_property.restype = c_bool
-_lib.TCOD_parser_get_bool_property.restype = c_bool
-_lib.TCOD_parser_get_float_property.restype = c_float
-_lib.TCOD_parser_get_string_property.restype = c_char_p
-_lib.TCOD_parser_get_color_property.restype = Color
+_lib.prototypes(
+    TCOD_struct_get_name=c_char_p,
+    TCOD_struct_is_mandatory=c_bool,
+    TCOD_parser_has_property=c_bool,
+    TCOD_parser_get_bool_property=c_bool,
+    TCOD_parser_get_float_property=c_float,
+    TCOD_parser_get_string_property=c_char_p,
+    TCOD_parser_get_color_property=Color,
+)
 
 class Dice(Structure):
     _fields_=[('nb_dices', c_int),
@@ -1404,8 +1666,10 @@ def parser_get_list_property(parser, name, typ):
 ############################
 # random module
 ############################
-_lib.TCOD_random_get_float.restype = c_float
-_lib.TCOD_random_get_double.restype = c_double
+_lib.prototypes(
+    TCOD_random_get_float=c_float,
+    TCOD_random_get_double=c_double,
+)
 
 RNG_MT = 0
 RNG_CMWC = 1
@@ -1458,12 +1722,14 @@ def random_delete(rnd):
 ############################
 # noise module
 ############################
-_lib.TCOD_noise_get.restype = c_float
-_lib.TCOD_noise_get_ex.restype = c_float
-_lib.TCOD_noise_get_fbm.restype = c_float
-_lib.TCOD_noise_get_fbm_ex.restype = c_float
-_lib.TCOD_noise_get_turbulence.restype = c_float
-_lib.TCOD_noise_get_turbulence_ex.restype = c_float
+_lib.prototypes(
+    TCOD_noise_get=c_float,
+    TCOD_noise_get_ex=c_float,
+    TCOD_noise_get_fbm=c_float,
+    TCOD_noise_get_fbm_ex=c_float,
+    TCOD_noise_get_turbulence=c_float,
+    TCOD_noise_get_turbulence_ex=c_float,
+)
 
 NOISE_DEFAULT_HURST = 0.5
 NOISE_DEFAULT_LACUNARITY = 2.0
@@ -1501,9 +1767,11 @@ def noise_delete(n):
 ############################
 # fov module
 ############################
-_lib.TCOD_map_is_in_fov.restype = c_bool
-_lib.TCOD_map_is_transparent.restype = c_bool
-_lib.TCOD_map_is_walkable.restype = c_bool
+_lib.prototypes(
+    TCOD_map_is_in_fov=c_bool,
+    TCOD_map_is_transparent=c_bool,
+    TCOD_map_is_walkable=c_bool,
+)
 
 FOV_BASIC = 0
 FOV_DIAMOND = 1
@@ -1559,9 +1827,11 @@ def map_get_height(map):
 ############################
 # pathfinding module
 ############################
-_lib.TCOD_path_compute.restype = c_bool
-_lib.TCOD_path_is_empty.restype = c_bool
-_lib.TCOD_path_walk.restype = c_bool
+_lib.prototypes(
+    TCOD_path_compute=c_bool,
+    TCOD_path_is_empty=c_bool,
+    TCOD_path_walk=c_bool,
+)
 
 PATH_CBK_FUNC = CFUNCTYPE(c_float, c_int, c_int, c_int, c_int, py_object)
 
@@ -1613,10 +1883,12 @@ def path_walk(p, recompute):
 def path_delete(p):
     _lib.TCOD_path_delete(p[0])
 
-_lib.TCOD_dijkstra_path_set.restype = c_bool
-_lib.TCOD_dijkstra_is_empty.restype = c_bool
-_lib.TCOD_dijkstra_path_walk.restype = c_bool
-_lib.TCOD_dijkstra_get_distance.restype = c_float
+_lib.prototypes(
+    TCOD_dijkstra_path_set=c_bool,
+    TCOD_dijkstra_is_empty=c_bool,
+    TCOD_dijkstra_path_walk=c_bool,
+    TCOD_dijkstra_get_distance=c_float,
+)
 
 def dijkstra_new(m, dcost=1.41):
     return (_lib.TCOD_dijkstra_new(c_void_p(m), c_float(dcost)), None)
@@ -1676,13 +1948,15 @@ class _CBsp(Structure):
                 ('horizontal', c_bool),
                 ]
 
-_lib.TCOD_bsp_new_with_size.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_left.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_right.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_father.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_is_leaf.restype = c_bool
-_lib.TCOD_bsp_contains.restype = c_bool
-_lib.TCOD_bsp_find_node.restype = POINTER(_CBsp)
+_lib.prototypes(
+    TCOD_bsp_new_with_size=POINTER(_CBsp),
+    TCOD_bsp_left=POINTER(_CBsp),
+    TCOD_bsp_right=POINTER(_CBsp),
+    TCOD_bsp_father=POINTER(_CBsp),
+    TCOD_bsp_is_leaf=c_bool,
+    TCOD_bsp_contains=c_bool,
+    TCOD_bsp_find_node=POINTER(_CBsp),
+)
 
 BSP_CBK_FUNC = CFUNCTYPE(c_int, c_void_p, c_void_p)
 
@@ -1807,9 +2081,11 @@ class _CHeightMap(Structure):
               ('values', POINTER(c_float)),
               ]
 
-_lib.TCOD_heightmap_new.restype = POINTER(_CHeightMap)
-_lib.TCOD_heightmap_get_value.restype = c_float
-_lib.TCOD_heightmap_has_land_on_border.restype = c_bool
+_lib.prototypes(
+    TCOD_heightmap_new=POINTER(_CHeightMap),
+    TCOD_heightmap_get_value=c_float,
+    TCOD_heightmap_has_land_on_border=c_bool,
+)
 
 class HeightMap(object):
     def __init__(self, chm):
@@ -1948,8 +2224,10 @@ def heightmap_delete(hm):
 ############################
 # name generator module
 ############################
-_lib.TCOD_namegen_generate.restype = c_char_p
-_lib.TCOD_namegen_generate_custom.restype = c_char_p
+_lib.prototypes(
+    TCOD_namegen_generate=c_char_p,
+    TCOD_namegen_generate_custom=c_char_p,
+)
 
 def namegen_parse(filename,random=0) :
     _lib.TCOD_namegen_parse(filename,random)
@@ -1971,3 +2249,10 @@ def namegen_destroy() :
     _lib.TCOD_namegen_destroy()
 
 
+
+if __name__ == '__main__':
+    # import time benchmark, the native library is not loaded by the import
+    import subprocess
+    code = 'import time; start = time.perf_counter(); import libtcodpy; print(time.perf_counter() - start)'
+    times = [float(subprocess.check_output([sys.executable, '-c', code])) for _ in range(10)]
+    print('import libtcodpy: {:.2f}ms (best of 10)'.format(min(times) * 1000))
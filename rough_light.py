@@ -1,8 +1,16 @@
+import numpy
+
 import libtcodpy as libtcod
 import src.rough_light_game as rl_game
 import src.objects
 import src.map
+import src.lighting
+import src.particles
 import src.utils as utils
+import src.color as color
+import src.render as render
+import src.minimap as minimap
+import src.camera as camera
 
 SCREEN_WIDTH = 100
 SCREEN_HEIGHT = 56
@@ -15,18 +23,31 @@ COLOR_DARK_GROUND = libtcod.Color(20, 20, 80)
 COLOR_LIGHT_GROUND = libtcod.Color(120, 120, 80)
 COLOR_UNEXPLORED = libtcod.Color(0, 0, 0)
 
-UNEXPLORED = src.map.Tile(COLOR_UNEXPLORED, False)
 
 STARTING_LIFE = 10
 
+# size in cells of the minimap and the mip levels it cycles through, None hides it
+MINIMAP_WIDTH = 24
+MINIMAP_HEIGHT = 12
+MINIMAP_LEVELS = (None, 1, 2, 3)
+
+# keep the player in the middle of the screen, instead of paging a screen at a time
+CAMERA_CENTERED = True
+
+# how Map.Random lays out the rooms, 'random' or 'bsp'
+MAP_LAYOUT = 'random'
+
+# precompute the FOV of the player's next step on a background thread
+SPECULATIVE_FOV = True
+
 FONT = b'arial8x8.png'
 TITLE = b'Rough Light'
 
 KEY_MOVEMENT_VECTORS = {
-    libtcod.KEY_UP: utils.Vector(0, 1),
-    libtcod.KEY_DOWN: utils.Vector(0, -1),
-    libtcod.KEY_LEFT: utils.Vector(-1, 0),
-    libtcod.KEY_RIGHT: utils.Vector(1, 0),
+    libtcod.KEY_UP: utils.Point(0, 1),
+    libtcod.KEY_DOWN: utils.Point(0, -1),
+    libtcod.KEY_LEFT: utils.Point(-1, 0),
+    libtcod.KEY_RIGHT: utils.Point(1, 0),
 }
 
 
@@ -39,10 +60,33 @@ class Game:
         self.height = height
         self.close_game = False
 
+        kwargs.setdefault('camera', camera.Camera(width, height, CAMERA_CENTERED))
+        kwargs.setdefault('speculative', SPECULATIVE_FOV)
         self.game = rl_game.RoughLightGame(game_map, width, height, **kwargs)
+        self.camera = self.game.camera
         self.objects = []
         self.map = game_map
 
+        # shades of the tiles and the palette ids of the tiles on screen, scrolled with the camera
+        self.palette = color.Palette()
+        self.tiles = render.ScrollBuffer(width, height, self.tile_ids)
+        # chunk key -> palette ids of the tiles of the chunk, indexed [y, x] from its bottom left
+        self.chunk_ids = {}
+        self.map_subscription = game_map.journal.subscribe()
+
+        # the frame is merged from the map, objects and effects drawn off-screen, see render.Layer
+        layers = [render.Layer('map', width, height, self.draw_map, self.map_inputs),
+                  render.Layer('objects', width, height, self.draw_objects, self.objects_inputs)]
+        if self.game.particles is not None:
+            layers.append(render.Layer('effects', width, height, self.draw_particles, self.particles_inputs))
+
+        # the overview of the explored world in the top right corner, toggled with m
+        self.minimap = minimap.Minimap(game_map, self.game.player)
+        self.minimap_level = None
+        layers.append(render.Layer('ui', width, height, self.draw_ui, self.ui_inputs))
+
+        self.compositor = render.Compositor(width, height, layers)
+
         # libtcod initialization
         libtcod.console_set_custom_font(FONT,
             libtcod.FONT_TYPE_GRAYSCALE | libtcod.FONT_LAYOUT_TCOD)
@@ -52,65 +96,166 @@ class Game:
 
     def run(self):
         # Game loop
-        while not (libtcod.console_is_window_closed() or self.close_game):
-            libtcod.console_set_window_title(bytes('{} {}'.format(str(TITLE), libtcod.sys_get_fps()), 'utf-8'))
-            self.step()
-            self.draw()
+        try:
+            while not (libtcod.console_is_window_closed() or self.close_game):
+                libtcod.console_set_window_title(bytes('{} {}'.format(str(TITLE), libtcod.sys_get_fps()), 'utf-8'))
+                self.step()
+                self.draw()
+        finally:
+            self.game.close()
       
     def step(self):
         # Advances the game 1 frame
         self.handle_keys()
+        self.game.update(1 / LIMIT_FPS)
 
     def draw(self):
-
-        # Get the current area the player is in based on own size
-        area = self.game.get_area(self.width, self.height)
-
-        # And draw it
-        for x, row in enumerate(area):
-            for y, square in enumerate(row):
-                tile = UNEXPLORED
-                color = tile.color
-                if square[0] in self.game.player.explored:
-                    tile = square[1]
-
-                    if square[0] in self.game.player.seen:
-                        color = tile.color
-                    else:
-                        color = tile.dark_color
-                libtcod.console_set_char_background(0, x, y, color, libtcod.BKGND_SET)
-
-
-
-        # Draw all objects in given area
-        drawn = []
-        for object in self.game.visible_objects():
-            self.draw_object(object)
-            drawn.append(object)
+        # Merge the layers that changed and write the frame with one fill per console layer
+        if self.compositor.compose():
+            back = self.compositor.back.reshape(-1, 3)
+            fore = self.compositor.fore.reshape(-1, 3)
+            libtcod.console_fill_background(0, back[:, 0], back[:, 1], back[:, 2])
+            libtcod.console_fill_foreground(0, fore[:, 0], fore[:, 1], fore[:, 2])
+            libtcod.console_fill_char(0, self.compositor.char.reshape(-1))
 
         libtcod.console_flush()
 
-        for object in drawn:
-            self.clear_object(object)
-
-
-    def draw_object(self, object, console=0):
-        # Draw given object on given console
-        x, y = self.convert_location(object.location)
-
-        libtcod.console_set_default_foreground(console, libtcod.Color(*object.color))
-        libtcod.console_put_char(console, x, y, object.symbol, libtcod.BKGND_NONE)
-
-    def clear_object(self, object, console=0):
-        # Clear the state for the next frame
-        x, y = self.convert_location(object.location)
-        libtcod.console_put_char(console, x, y, ' ', libtcod.BKGND_NONE)
+    def corner(self):
+        # The bottom left corner of the view
+        return self.camera.corner(self.game.player.location)
+
+    def map_inputs(self):
+        # lights that moved or reach an edit are recomputed first, which bumps the lighting version
+        lighting = self.game.lighting
+        if lighting:
+            lighting.update()
+        return (self.corner(), self.game.player.seen, self.map.version,
+                lighting.version if lighting else None)
+
+    def tile_ids(self, rect):
+        # The palette ids of the tiles of rect, indexed [screen y, screen x], copied from the chunk caches
+        ids = numpy.empty((rect.y2 - rect.y1, rect.x2 - rect.x1), numpy.intp)
+        for cx in range(rect.x1 >> utils.CHUNK_SHIFT, ((rect.x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+            for cy in range(rect.y1 >> utils.CHUNK_SHIFT, ((rect.y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                x0, y0 = cx << utils.CHUNK_SHIFT, cy << utils.CHUNK_SHIFT
+                left, right = max(rect.x1, x0), min(rect.x2, x0 + utils.CHUNK_SIZE)
+                bottom, top = max(rect.y1, y0), min(rect.y2, y0 + utils.CHUNK_SIZE)
+                block = self.chunk_tile_ids((cx, cy))[bottom - y0:top - y0, left - x0:right - x0]
+                ids[rect.y2 - top:rect.y2 - bottom, left - rect.x1:right - rect.x1] = block[::-1]
+        return ids
+
+    def chunk_tile_ids(self, key):
+        # The palette ids of the tiles of a chunk, computed on its first use
+        ids = self.chunk_ids.get(key)
+        if ids is None:
+            x0, y0 = key[0] << utils.CHUNK_SHIFT, key[1] << utils.CHUNK_SHIFT
+            ids = self.chunk_ids[key] = self.block_ids(x0, y0, x0 + utils.CHUNK_SIZE, y0 + utils.CHUNK_SIZE)
+        return ids
+
+    def block_ids(self, x1, y1, x2, y2):
+        # The palette ids of the tiles from (x1, y1) to (x2, y2) excluded, indexed [y - y1, x - x1].
+        # The palette is looked up once per distinct tile
+        known = {}
+        ids = []
+        for y in range(y1, y2):
+            for tile in self.map.tile_row(x1, y, x2 - x1):
+                id = known.get(tile)
+                if id is None:
+                    id = known[tile] = self.palette.add_tile(tile)
+                ids.append(id)
+        return numpy.array(ids, numpy.intp).reshape(y2 - y1, x2 - x1)
+
+    def update_tile_ids(self, changes):
+        # Updates the cached ids of the edited locations and of the view, see Map.journal
+        if changes is None:
+            self.chunk_ids.clear()
+            self.tiles.invalidate()
+            return
+
+        for key, edit in changes.items():
+            ids = self.chunk_ids.get(key)
+            if ids is not None:
+                x0, y0 = key[0] << utils.CHUNK_SHIFT, key[1] << utils.CHUNK_SHIFT
+                x1, y1 = max(edit.x1, x0), max(edit.y1, y0)
+                x2, y2 = min(edit.x2, x0 + utils.CHUNK_SIZE), min(edit.y2, y0 + utils.CHUNK_SIZE)
+                if x1 < x2 and y1 < y2:
+                    ids[y1 - y0:y2 - y0, x1 - x0:x2 - x0] = self.block_ids(x1, y1, x2, y2)
+            self.tiles.refresh(edit)
+
+    def draw_map(self, layer):
+        # Shade the background of the whole view with a few array operations, see color.Palette
+        corner = self.corner()
+        rect = utils.Rect(corner[0], corner[1], self.width, self.height)
+
+        # tiles edited since the last frame
+        self.update_tile_ids(self.map_subscription.pull())
+        ids = self.tiles.move(corner)
+
+        # packed keys of the locations on screen, see utils.pack
+        xs = numpy.arange(rect.x1, rect.x2, dtype=numpy.int64)
+        ys = numpy.arange(rect.y2 - 1, rect.y1 - 1, -1, dtype=numpy.int64)
+        keys = (ys[:, None] << utils.PACK_SHIFT) + xs[None, :]
+
+        # only the keys on screen are looked up, whatever the size of the explored world
+        player = self.game.player
+        keys = keys.ravel().tolist()
+        seen = numpy.fromiter(map(player.seen.keys.__contains__, keys), bool, len(keys))
+        explored = numpy.fromiter(map(player.explored.keys.__contains__, keys), bool, len(keys))
+        seen, explored = seen.reshape(self.height, self.width), explored.reshape(self.height, self.width)
+
+        # the light of the area, lighting windows are indexed from the bottom
+        light = None
+        if self.game.lighting:
+            light = self.game.lighting.window(rect)[::-1]
+
+        background = numpy.where(seen[..., None], self.palette.shade(ids, light), self.palette.dark(ids))
+        layer.fill(numpy.where(explored[..., None], background, color.as_array(COLOR_UNEXPLORED)))
+
+    def objects_inputs(self):
+        return (self.corner(), tuple((tuple(object.location), object.symbol, color.rgb(object.color))
+                                     for object in self.game.visible_objects()))
+
+    def draw_objects(self, layer):
+        # Draw the visible objects of the area, those listed first in the game on top
+        objects = list(self.game.visible_objects())
+        if not objects:
+            return
+
+        xs, ys = zip(*(self.convert_location(object.location) for object in objects))
+        layer.put(list(xs), list(ys), [ord(object.symbol) for object in objects],
+                  [color.rgb(object.color) for object in objects])
+
+    def particles_inputs(self):
+        return (self.corner(), self.game.player.seen, self.game.particles.version)
+
+    def draw_particles(self, layer):
+        # Draw the visible particles of the area
+        corner = self.corner()
+        rect = utils.Rect(corner[0], corner[1], self.width, self.height)
+        xs, ys, symbols, colors = self.game.particles.cells(rect, self.game.player.seen)
+
+        # screen cells, see convert_location
+        layer.put(xs - corner[0], self.height - 1 - (ys - corner[1]), symbols, colors)
+
+    def ui_inputs(self):
+        # the minimap drains the cells explored meanwhile even when hidden
+        self.minimap.update()
+        if self.minimap_level is None:
+            return (None,)
+        return (self.minimap_level, self.minimap.version, tuple(self.game.player.location))
+
+    def draw_ui(self, layer):
+        # Draw the minimap around the player at the current zoom level
+        if self.minimap_level is None:
+            return
+        back, fore, char = self.minimap.render(self.game.player.location, MINIMAP_WIDTH, MINIMAP_HEIGHT, self.minimap_level)
+        layer.blit(self.width - MINIMAP_WIDTH, 0, back, fore, char)
 
     def convert_location(self, location):
         ''' converts a cartasian coordinate into a coordinate to display on screen
             screen coordinates go from 0 to width and 0 to height
         '''
-        return utils.Vector(location[0] % self.width, (-location[1] - 1) % self.height)
+        return self.camera.to_screen(location, self.game.player.location)
 
     def handle_keys(self):
 
@@ -123,6 +268,10 @@ class Game:
         if key.vk == libtcod.KEY_ENTER and key.lalt:
             libtcod.console_set_fullscreen(not libtcod.console_is_fullscreen())
 
+        elif key.c == ord('m'):
+            index = MINIMAP_LEVELS.index(self.minimap_level)
+            self.minimap_level = MINIMAP_LEVELS[(index + 1) % len(MINIMAP_LEVELS)]
+
         elif key.vk == libtcod.KEY_ESCAPE:
             self.close_game = True
 
@@ -136,7 +285,17 @@ if __name__ == '__main__':
     
     #game_map = src.map.Map(default=walkable)
 
-    game_map = src.map.Map.Random(area, 26, 11, 11, utils.Vector(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2), default, walkable)
+    game_map = src.map.Map.Random(area, 26, 11, 11, utils.Vector(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2), default, walkable,
+                                  layout=MAP_LAYOUT)
     #print(list(str(room) for room in game_map.rooms))
-    game = Game(game_map, start=(50, 28));
+    lighting = src.lighting.Lighting(game_map)
+    for room in game_map.rooms:
+        lighting.add(src.lighting.Light(room.get_center(), 6, 0.5))
+
+    player_light = src.lighting.Light((50, 28), 10, static=False)
+    lighting.add(player_light)
+
+    particles = src.particles.Particles(game_map=game_map)
+
+    game = Game(game_map, start=(50, 28), lighting=lighting, player_light=player_light, particles=particles);
     game.run()
\ No newline at end of file
@@ -0,0 +1,274 @@
+''' Binary space partition trees without libtcod, with the functions of the libtcodpy bsp module.
+    Nodes are plain Python objects and the bsp_traverse_* functions walk them with
+    generators instead of calling back through ctypes for every node. The leaves of
+    a tree always partition its area, so rooms placed inside distinct leaves never overlap.
+'''
+
+import heapq
+import random
+from collections import deque
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+
+class Bsp:
+
+    ''' A node covering the w * h cells from (x, y). Nodes are either leaves or split
+        at position into a left and a right son, horizontal splits cutting along
+        y = position with the left son below it, vertical ones along x = position.
+    '''
+
+    def __init__(self, x, y, w, h, level=0, father=None):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.level = level
+        self.father = father
+
+        self.position = 0
+        self.horizontal = False
+        self.left = None
+        self.right = None
+
+    def __repr__(self):
+        return 'Bsp({}, {}, {}, {})'.format(self.x, self.y, self.w, self.h)
+
+    def rect(self):
+        return utils.Rect(self.x, self.y, self.w, self.h)
+
+    def is_leaf(self):
+        return self.left is None
+
+    def contains(self, cx, cy):
+        return self.x <= cx < self.x + self.w and self.y <= cy < self.y + self.h
+
+    def find_node(self, cx, cy):
+        ''' returns the deepest node containing (cx, cy), None if the tree doesn't '''
+        if not self.contains(cx, cy):
+            return None
+        node = self
+        while not node.is_leaf():
+            node = node.left if node.left.contains(cx, cy) else node.right
+        return node
+
+    def split_once(self, horizontal, position):
+        self.horizontal = horizontal
+        self.position = position
+        if horizontal:
+            self.left = Bsp(self.x, self.y, self.w, position - self.y, self.level + 1, self)
+            self.right = Bsp(self.x, position, self.w, self.y + self.h - position, self.level + 1, self)
+        else:
+            self.left = Bsp(self.x, self.y, position - self.x, self.h, self.level + 1, self)
+            self.right = Bsp(position, self.y, self.x + self.w - position, self.h, self.level + 1, self)
+
+    def split_random(self, randomizer, minHSize, minVSize, maxHRatio, maxVRatio):
+        ''' splits the node at a random position leaving sons at least minHSize wide and
+            minVSize high, returns false if it is too small. Nodes wider than maxHRatio
+            times their height are split vertically, and those higher than maxVRatio
+            times their width horizontally, to promote square leaves.
+        '''
+        horizontal_fits = self.h >= 2 * minVSize
+        vertical_fits = self.w >= 2 * minHSize
+        if not (horizontal_fits or vertical_fits):
+            return False
+
+        if not horizontal_fits or (vertical_fits and self.w > self.h * maxHRatio):
+            horizontal = False
+        elif not vertical_fits or self.h > self.w * maxVRatio:
+            horizontal = True
+        else:
+            horizontal = randomizer.randint(0, 1) == 0
+
+        if horizontal:
+            self.split_once(True, randomizer.randint(self.y + minVSize, self.y + self.h - minVSize))
+        else:
+            self.split_once(False, randomizer.randint(self.x + minHSize, self.x + self.w - minHSize))
+        return True
+
+    def split_recursive(self, randomizer, nb, minHSize, minVSize, maxHRatio, maxVRatio):
+        ''' splits the node and its sons down to nb levels, see split_random '''
+        randomizer = _randomizer(randomizer)
+        nodes = [(self, nb)]
+        while nodes:
+            node, nb = nodes.pop()
+            if nb > 0 and node.split_random(randomizer, minHSize, minVSize, maxHRatio, maxVRatio):
+                nodes.append((node.right, nb - 1))
+                nodes.append((node.left, nb - 1))
+
+    def split_leaves(self, randomizer, count, minHSize, minVSize, maxHRatio, maxVRatio):
+        ''' splits the largest leaf until the tree has count leaves, or none can be split.
+            Returns the number of leaves.
+        '''
+        randomizer = _randomizer(randomizer)
+        leaves = [(-node.w * node.h, i, node) for i, node in enumerate(self.leaves())]
+        heapq.heapify(leaves)
+        number = len(leaves)
+        order = number
+
+        while leaves and number < count:
+            _, _, node = heapq.heappop(leaves)
+            if not node.split_random(randomizer, minHSize, minVSize, maxHRatio, maxVRatio):
+                continue
+            number += 1
+            for son in (node.left, node.right):
+                heapq.heappush(leaves, (-son.w * son.h, order, son))
+                order += 1
+        return number
+
+    def resize(self, x, y, w, h):
+        ''' moves the node to a new area, its sons keep their split positions '''
+        nodes = [(self, x, y, w, h)]
+        while nodes:
+            node, x, y, w, h = nodes.pop()
+            node.x, node.y, node.w, node.h = x, y, w, h
+            if node.is_leaf():
+                continue
+            if node.horizontal:
+                nodes.append((node.left, x, y, w, node.position - y))
+                nodes.append((node.right, x, node.position, w, y + h - node.position))
+            else:
+                nodes.append((node.left, x, y, node.position - x, h))
+                nodes.append((node.right, node.position, y, x + w - node.position, h))
+
+    def remove_sons(self):
+        self.left = None
+        self.right = None
+
+    def sons(self):
+        return () if self.is_leaf() else (self.left, self.right)
+
+    def pre_order(self):
+        ''' yields the node, then the nodes of its left and right sons '''
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            yield node
+            nodes.extend(reversed(node.sons()))
+
+    def in_order(self):
+        ''' yields the nodes of the left son, the node, then the nodes of the right son '''
+        nodes = []
+        node = self
+        while nodes or node is not None:
+            while node is not None:
+                nodes.append(node)
+                node = node.left
+            node = nodes.pop()
+            yield node
+            node = node.right
+
+    def post_order(self):
+        ''' yields the nodes of the left and right sons, then the node '''
+        nodes = [(self, False)]
+        while nodes:
+            node, visited = nodes.pop()
+            if visited or node.is_leaf():
+                yield node
+            else:
+                nodes.append((node, True))
+                nodes.append((node.right, False))
+                nodes.append((node.left, False))
+
+    def level_order(self):
+        ''' yields the nodes level by level from the root, left to right '''
+        nodes = deque([self])
+        while nodes:
+            node = nodes.popleft()
+            yield node
+            nodes.extend(node.sons())
+
+    def inverted_level_order(self):
+        ''' yields the nodes of level_order in reverse order, the leaves of the deepest level first '''
+        return reversed(list(self.level_order()))
+
+    def leaves(self):
+        return (node for node in self.pre_order() if node.is_leaf())
+
+
+def _randomizer(randomizer):
+    # the generator of a randomizer argument: 0 or None for the random module, a seed or a random.Random
+    if not randomizer:
+        return random
+    if isinstance(randomizer, random.Random):
+        return randomizer
+    return random.Random(randomizer)
+
+
+def bsp_new_with_size(x, y, w, h):
+    return Bsp(x, y, w, h)
+
+
+def bsp_split_once(node, horizontal, position):
+    node.split_once(horizontal, position)
+
+
+def bsp_split_recursive(node, randomizer, nb, minHSize, minVSize, maxHRatio, maxVRatio):
+    node.split_recursive(randomizer, nb, minHSize, minVSize, maxHRatio, maxVRatio)
+
+
+def bsp_resize(node, x, y, w, h):
+    node.resize(x, y, w, h)
+
+
+def bsp_left(node):
+    return node.left
+
+
+def bsp_right(node):
+    return node.right
+
+
+def bsp_father(node):
+    return node.father
+
+
+def bsp_is_leaf(node):
+    return node.is_leaf()
+
+
+def bsp_contains(node, cx, cy):
+    return node.contains(cx, cy)
+
+
+def bsp_find_node(node, cx, cy):
+    return node.find_node(cx, cy)
+
+
+def _bsp_traverse(nodes, callback, userData):
+    # like libtcod, the traversal stops at the first node the callback returns false for
+    for node in nodes:
+        if not callback(node, userData):
+            return False
+    return True
+
+
+def bsp_traverse_pre_order(node, callback, userData=0):
+    return _bsp_traverse(node.pre_order(), callback, userData)
+
+
+def bsp_traverse_in_order(node, callback, userData=0):
+    return _bsp_traverse(node.in_order(), callback, userData)
+
+
+def bsp_traverse_post_order(node, callback, userData=0):
+    return _bsp_traverse(node.post_order(), callback, userData)
+
+
+def bsp_traverse_level_order(node, callback, userData=0):
+    return _bsp_traverse(node.level_order(), callback, userData)
+
+
+def bsp_traverse_inverted_level_order(node, callback, userData=0):
+    return _bsp_traverse(node.inverted_level_order(), callback, userData)
+
+
+def bsp_remove_sons(node):
+    node.remove_sons()
+
+
+def bsp_delete(node):
+    node.remove_sons()
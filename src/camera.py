@@ -0,0 +1,44 @@
+''' The part of the world shown on screen. '''
+
+import math
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+
+class Camera:
+
+    ''' A view of width * height locations following a target location.
+        A centered camera keeps the target in the middle of the view and moves with it
+        one location at a time, otherwise the view is paged a whole screen at once like Map.get_area.
+    '''
+
+    def __init__(self, width, height, centered=True):
+        if (width == 0 or height == 0):
+            raise ValueError('Width and height must not be 0')
+
+        self.width = width
+        self.height = height
+        self.centered = centered
+
+    def corner(self, target):
+        ''' returns the bottom left location of the view around target '''
+        if self.centered:
+            return (target[0] - self.width // 2, target[1] - self.height // 2)
+        return (math.floor(target[0] / self.width) * self.width, math.floor(target[1] / self.height) * self.height)
+
+    def rect(self, target):
+        x, y = self.corner(target)
+        return utils.Rect(x, y, self.width, self.height)
+
+    def in_view(self, location, target):
+        ''' returns true if location is shown in the view around target '''
+        x, y = self.corner(target)
+        return x <= location[0] < x + self.width and y <= location[1] < y + self.height
+
+    def to_screen(self, location, target):
+        ''' returns the screen coordinates of location in the view around target, the top row is 0 '''
+        x, y = self.corner(target)
+        return utils.Point(location[0] - x, self.height - 1 - (location[1] - y))
@@ -0,0 +1,123 @@
+''' Cellular automaton cave generation.
+    The whole area is smoothed at once with NumPy neighbour counts and the
+    result is returned as an array of cells, 1 for floor and 0 for wall,
+    ready to be written into a Map with Map.set_tiles.
+'''
+
+import numpy
+
+# neighbour offsets of the 8-connected neighbourhood
+NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+
+def neighbour_count(walls):
+    ''' returns the number of walls around every cell, the outside of the area counts as wall '''
+    height, width = walls.shape
+    padded = numpy.pad(walls, 1, constant_values=True).astype(numpy.uint8)
+
+    count = numpy.zeros((height, width), numpy.uint8)
+    for dy, dx in NEIGHBOURS:
+        count += padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+    return count
+
+
+def smooth(walls, birth=5, survival=4):
+    ''' runs a single step of the automaton: a floor turns into a wall when at least
+        birth of its neighbours are walls, a wall stays one with at least survival wall neighbours.
+    '''
+    count = neighbour_count(walls)
+    return numpy.where(walls, count >= survival, count >= birth)
+
+
+def label_runs(floor):
+    ''' splits the floor into horizontal runs and labels every run with its 4-connected component.
+        Returns the row, start, end and label arrays of the runs.
+    '''
+    height, width = floor.shape
+
+    # runs start where the padded row goes from wall to floor and end where it goes back
+    edges = numpy.diff(numpy.pad(floor, ((0, 0), (1, 1))).astype(numpy.int8), axis=1)
+    rows, starts = numpy.nonzero(edges == 1)
+    _, ends = numpy.nonzero(edges == -1)
+
+    # runs as positions on a single line, leaving a gap between rows so runs never touch across rows
+    stride = width + 1
+    line_starts = rows * stride + starts
+    line_ends = rows * stride + ends
+
+    # runs of the row below a run overlapping its columns are connected to it
+    below_starts = line_starts - stride
+    below_ends = line_ends - stride
+    first = numpy.searchsorted(line_ends, below_starts, side='right')
+    last = numpy.searchsorted(line_starts, below_ends, side='left')
+
+    counts = numpy.maximum(last - first, 0)
+    upper = numpy.repeat(numpy.arange(len(rows)), counts)
+    lower = numpy.repeat(first, counts) + (numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts))
+
+    # union find over the runs
+    parent = list(range(len(rows)))
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    for a, b in zip(upper.tolist(), lower.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    labels = numpy.array([find(run) for run in range(len(rows))], dtype=numpy.int64)
+    return rows, starts, ends, labels
+
+
+def connect(floor, min_size=16):
+    ''' repairs the connectivity of the floor in place.
+        Components smaller than min_size are filled, the others are joined to the
+        largest component with a straight horizontal and vertical tunnel.
+    '''
+    rows, starts, ends, labels = label_runs(floor)
+    if not len(rows):
+        return floor
+
+    sizes = numpy.bincount(labels, weights=ends - starts)
+    main = int(numpy.argmax(sizes))
+
+    main_runs = labels == main
+    main_x = ((starts + ends) // 2)[main_runs]
+    main_y = rows[main_runs]
+
+    # fill the small components
+    for run in numpy.nonzero(sizes[labels] < min_size)[0].tolist():
+        floor[rows[run], starts[run]:ends[run]] = False
+
+    for component in numpy.nonzero(sizes >= min_size)[0].tolist():
+        if component == main:
+            continue
+
+        # labels are the index of the first run of their component
+        x, y = (int(starts[component]) + int(ends[component])) // 2, int(rows[component])
+
+        # tunnel to the closest run of the main component
+        closest = numpy.argmin(numpy.abs(main_x - x) + numpy.abs(main_y - y))
+        target_x, target_y = int(main_x[closest]), int(main_y[closest])
+        floor[y, min(x, target_x):max(x, target_x) + 1] = True
+        floor[min(y, target_y):max(y, target_y) + 1, target_x] = True
+
+    return floor
+
+
+def generate(width, height, fill=0.45, iterations=4, birth=5, survival=4, min_size=16, seed=None):
+    ''' generates a connected cave of width * height cells.
+        Returns a uint8 array of shape (height, width) with 1 for floor, row 0 being the bottom row.
+    '''
+    rng = numpy.random.default_rng(seed)
+    walls = rng.random((height, width)) < fill
+
+    for _ in range(iterations):
+        walls = smooth(walls, birth, survival)
+
+    floor = connect(~walls, min_size)
+    return floor.astype(numpy.uint8)
@@ -0,0 +1,145 @@
+''' Color math over NumPy arrays, without a call into libtcod per color.
+    Colors are uint8 arrays whose last axis holds (r, g, b), so a single color,
+    a row or a whole frame go through the same functions. Results follow the
+    libtcod color functions they replace, fractions are truncated like its casts.
+'''
+
+import numpy
+
+
+def rgb(color):
+    ''' returns the (r, g, b) tuple of a libtcod Color or of any (r, g, b) sequence '''
+    if hasattr(color, 'r'):
+        return (color.r, color.g, color.b)
+    return tuple(color)
+
+
+def as_array(colors):
+    ''' returns colors as a uint8 array, colors are rgb-able values or arrays of them '''
+    if isinstance(colors, numpy.ndarray):
+        return colors.astype(numpy.uint8, copy=False)
+    if hasattr(colors, 'r'):
+        return numpy.array(rgb(colors), numpy.uint8)
+    return numpy.array([rgb(color) if hasattr(color, 'r') else color for color in colors], numpy.uint8)
+
+
+def _clip(values):
+    return numpy.clip(values, 0, 255).astype(numpy.uint8)
+
+
+def lerp(color1, color2, coef):
+    ''' returns color1 + (color2 - color1) * coef, like color_lerp, coef may be an array '''
+    color1 = as_array(color1).astype(numpy.float32)
+    color2 = as_array(color2).astype(numpy.float32)
+    coef = numpy.asarray(coef, numpy.float32)
+    if coef.ndim:
+        coef = coef[..., None]
+    return (color1 + (color2 - color1) * coef).astype(numpy.uint8)
+
+
+def scale(colors, value):
+    ''' returns colors multiplied by value, clamped to 255, like Color * float '''
+    value = numpy.asarray(value, numpy.float32)
+    if value.ndim:
+        value = value[..., None]
+    return _clip(as_array(colors) * value)
+
+
+def multiply(colors1, colors2):
+    ''' returns the channel wise product of two colors, like Color * Color '''
+    return (as_array(colors1).astype(numpy.uint16) * as_array(colors2) // 255).astype(numpy.uint8)
+
+
+def add(colors1, colors2):
+    return _clip(as_array(colors1).astype(numpy.int16) + as_array(colors2))
+
+
+def subtract(colors1, colors2):
+    return _clip(as_array(colors1).astype(numpy.int16) - as_array(colors2))
+
+
+def to_hsv(colors):
+    ''' returns the (hue, saturation, value) arrays of colors, hue in degrees and the others in [0, 1] '''
+    colors = as_array(colors).astype(numpy.float32) / 255
+    r, g, b = colors[..., 0], colors[..., 1], colors[..., 2]
+
+    high = colors.max(axis=-1)
+    delta = high - colors.min(axis=-1)
+    saturation = numpy.where(high > 0, delta / numpy.where(high > 0, high, 1), 0)
+
+    safe = numpy.where(delta > 0, delta, 1)
+    hue = numpy.select([r == high, g == high], [(g - b) / safe, 2 + (b - r) / safe], 4 + (r - g) / safe)
+    hue = numpy.where(delta > 0, (hue * 60) % 360, 0)
+    return hue, saturation, high
+
+
+def from_hsv(hue, saturation, value):
+    ''' returns the colors of the given hue, saturation and value arrays, see to_hsv '''
+    hue, saturation, value = numpy.broadcast_arrays(*(numpy.asarray(x, numpy.float32) for x in (hue, saturation, value)))
+
+    hue = (hue % 360) / 60
+    sector = numpy.floor(hue).astype(numpy.int8)
+    fraction = hue - sector
+    p = value * (1 - saturation)
+    q = value * (1 - saturation * fraction)
+    t = value * (1 - saturation * (1 - fraction))
+
+    # the channels of each of the 6 sectors of the color wheel
+    channels = numpy.stack([numpy.stack(sector_channels, axis=-1) for sector_channels in
+                            ((value, t, p), (q, value, p), (p, value, t), (p, q, value), (t, p, value), (value, p, q))])
+    colors = numpy.take_along_axis(channels, sector[None, ..., None], axis=0)[0]
+    colors = numpy.where((saturation == 0)[..., None], value[..., None], colors)
+    return (colors * 255 + 0.5).astype(numpy.uint8)
+
+
+def gen_map(colors, indexes):
+    ''' returns a gradient of max(indexes) + 1 colors going through colors[i] at indexes[i], like color_gen_map '''
+    colors = as_array(colors)
+    result = numpy.zeros((max(indexes) + 1, 3), numpy.uint8)
+    for i in range(len(indexes) - 1):
+        start, end = indexes[i], indexes[i + 1]
+        coef = numpy.arange(end - start + 1, dtype=numpy.float32) / max(end - start, 1)
+        result[start:end + 1] = lerp(colors[i], colors[i + 1], coef)
+    return result
+
+
+class Palette:
+
+    ''' Lookup tables of the shades of tiles between their dark and light color.
+        Every (color, dark_color) pair is given an id with add, its levels shades are
+        computed once, and shade turns arrays of ids and light into colors at once.
+    '''
+
+    def __init__(self, levels=256):
+        self.levels = levels
+
+        # (color, dark color) -> id, the row of the pair in table
+        self.ids = {}
+        self.table = numpy.zeros((0, levels, 3), numpy.uint8)
+
+    def add(self, color, dark_color):
+        ''' returns the id of the shades from dark_color to color '''
+        key = (rgb(color), rgb(dark_color))
+        id = self.ids.get(key)
+        if id is None:
+            shades = gen_map([key[1], key[0]], [0, self.levels - 1])
+            self.table = numpy.concatenate((self.table, shades[None]))
+            id = self.ids[key] = len(self.table) - 1
+        return id
+
+    def add_tile(self, tile):
+        ''' returns the id of the shades of a map.Tile '''
+        return self.add(tile.color, tile.dark_color)
+
+    def shade(self, ids, light=None):
+        ''' returns the colors of ids lit by light, an array in [0, 1] of the same shape,
+            fully lit when light is None. Light 0 gives the dark color of a tile.
+        '''
+        if light is None:
+            return self.table[ids, self.levels - 1]
+        levels = (numpy.clip(light, 0, 1) * (self.levels - 1)).astype(numpy.intp)
+        return self.table[ids, levels]
+
+    def dark(self, ids):
+        ''' returns the dark colors of ids '''
+        return self.table[ids, 0]
@@ -0,0 +1,205 @@
+import itertools
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+
+class Connectivity:
+
+    ''' Tracks which walkable locations of a map are connected to each other.
+        Walkable locations are kept in a union find, updated from the map journal
+        as they are carved, so asking whether everything is reachable from start
+        costs next to nothing once the carving has been pulled.
+        Only locations that were written to the map are tracked, the default tile is ignored.
+    '''
+
+    def __init__(self, game_map, start):
+        self.map = game_map
+        self.start = tuple(start)
+
+        self.subscription = self.map.journal.subscribe()
+        self.rebuild()
+
+    def rebuild(self):
+        ''' forgets everything and adds every walkable location of the map again.
+            Each run of a row becomes a component at once, joined to the runs it overlaps on the row below.
+        '''
+        self.parent = {}
+        self.size = {}
+        self.components = 0
+
+        self.subscription.version = self.map.version
+
+        # the packed keys of a row are consecutive, so the sorted keys split into the runs of every row
+        keys = sorted(key for key, tile in self.map.grid.items() if not tile.blocks)
+        starts = [i for i in range(len(keys)) if not i or keys[i] != keys[i - 1] + 1]
+
+        # runs of the previous and current rows as (x1, x2, root), ordered by x
+        below, row, row_y = [], [], None
+        for start, end in zip(starts, starts[1:] + [len(keys)]):
+            x1, y = utils.unpack(keys[start])
+            x2 = x1 + end - start
+            if y != row_y:
+                below = row if row_y == y - 1 else []
+                row, row_y, i = [], y, 0
+
+            root = (x1, y)
+            self.parent.update(dict.fromkeys(zip(range(x1, x2), itertools.repeat(y)), root))
+            self.size[root] = x2 - x1
+            self.components += 1
+            row.append((x1, x2, root))
+
+            # skip the runs below that end before this one, the next runs of the row start further right
+            while i < len(below) and below[i][1] <= x1:
+                i += 1
+            j = i
+            while j < len(below) and below[j][0] < x2:
+                self.union(root, below[j][2])
+                j += 1
+
+    def find(self, location):
+        ''' returns the representative location of the component holding location '''
+        parent = self.parent
+        while parent[location] != location:
+            parent[location] = parent[parent[location]]
+            location = parent[location]
+        return location
+
+    def union(self, location1, location2):
+        ''' merges the components of two tracked locations '''
+        root1 = self.find(location1)
+        root2 = self.find(location2)
+        if root1 == root2:
+            return
+
+        # attach the smaller component below the bigger one
+        if self.size[root1] < self.size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.size[root1] += self.size.pop(root2)
+        self.components -= 1
+
+    def add(self, location):
+        ''' starts tracking a walkable location and connects it to its tracked neighbours '''
+        if location in self.parent:
+            return
+
+        self.parent[location] = location
+        self.size[location] = 1
+        self.components += 1
+
+        x, y = location
+        for neighbour in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if neighbour in self.parent:
+                self.union(location, neighbour)
+
+    def add_run(self, x1, x2, y):
+        ''' starts tracking the walkable locations from (x1, y) to (x2 - 1, y) as one component
+            and connects it to its tracked neighbours
+        '''
+        parent = self.parent
+        locations = [(x, y) for x in range(x1, x2)]
+        new = [location for location in locations if location not in parent]
+        if not new:
+            return
+        tracked = [location for location in locations if location in parent] if len(new) < len(locations) else []
+
+        root = new[0]
+        parent.update(dict.fromkeys(new, root))
+        self.size[root] = len(new)
+        self.components += 1
+
+        for location in tracked + [(x1 - 1, y), (x2, y)]:
+            if location in parent:
+                self.union(root, location)
+
+        # a single union per stretch of tracked locations below and above the run
+        for row in (y - 1, y + 1):
+            neighbours = [x for x in range(x1, x2) if (x, row) in parent]
+            for x in [x for x, previous in zip(neighbours, [None] + neighbours) if previous != x - 1]:
+                self.union(root, (x, row))
+
+    def update(self):
+        ''' pulls the edits made to the map since the last update and adds the walkable
+            runs of the locations they wrote. Walls written over tracked locations can split
+            components, which a union find cannot undo, so those trigger a rebuild.
+        '''
+        edits = self.subscription.pull_edits()
+        if edits is None:
+            self.rebuild()
+            return
+
+        for x1, y1, x2, y2 in edits:
+            width = x2 - x1
+            window = self.map.walkability_window(utils.Rect(x1, y1, width, y2 - y1))
+            for y in range(y1, y2):
+                row = window[(y - y1) * width:(y - y1 + 1) * width]
+                if 0 in row and any(not walkable and (x, y) in self.parent for x, walkable in zip(range(x1, x2), row)):
+                    self.rebuild()
+                    return
+
+                run_start = row.find(1)
+                while run_start != -1:
+                    run_end = row.find(0, run_start)
+                    if run_end == -1:
+                        run_end = width
+                    self.add_run(x1 + run_start, x1 + run_end, y)
+                    run_start = row.find(1, run_end)
+
+    def is_connected(self):
+        ''' returns true if every tracked walkable location can be reached from start '''
+        self.update()
+        return self.start in self.parent and self.components == 1
+
+    def suggest_connections(self):
+        ''' returns a list of (location1, location2) pairs, connecting each pair (see Map.set_connection)
+            joins every component to the one holding start. The pairs form a minimum spanning tree
+            over the components, measured between one location per component per chunk.
+        '''
+        self.update()
+        if self.components <= 1 and self.start in self.parent:
+            return []
+
+        # one representative location per component and chunk
+        representatives = {}
+        for location in self.parent:
+            key = (self.find(location), utils.chunk_key(location))
+            representatives.setdefault(key, location)
+
+        components = {}
+        for (root, _), location in representatives.items():
+            components.setdefault(root, []).append(location)
+
+        # the start belongs to the tree even if it is not walkable yet
+        if self.start not in self.parent:
+            components[self.start] = [self.start]
+
+        def distance(pair):
+            return abs(pair[0][0] - pair[1][0]) + abs(pair[0][1] - pair[1][1])
+
+        edges = []
+        roots = list(components)
+        for i, root1 in enumerate(roots):
+            for root2 in roots[i + 1:]:
+                pair = min(((a, b) for a in components[root1] for b in components[root2]), key=distance)
+                edges.append((distance(pair), root1, root2, pair))
+
+        # kruskal over the components
+        parent = {root: root for root in roots}
+
+        def find(root):
+            while parent[root] != root:
+                parent[root] = parent[parent[root]]
+                root = parent[root]
+            return root
+
+        connections = []
+        for _, root1, root2, pair in sorted(edges, key=lambda edge: edge[0]):
+            tree1, tree2 = find(root1), find(root2)
+            if tree1 != tree2:
+                parent[tree2] = tree1
+                connections.append(pair)
+
+        return connections
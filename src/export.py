@@ -0,0 +1,168 @@
+''' Export of whole maps as PNG images, without libtcod.
+    The image is produced a band of rows at a time from the map chunks and streamed
+    through zlib into the PNG file, so memory stays bounded by the width of the map
+    whatever its height. Thumbnails average square blocks of locations per pixel.
+'''
+
+import math
+import struct
+import zlib
+
+import numpy
+
+try:
+    from . import utils
+    from . import color
+except ImportError:
+    import utils
+    import color
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# compressed data is written out in IDAT chunks of about this many bytes
+IDAT_SIZE = 1 << 16
+
+# unexplored locations are darkened to this fraction of their color
+UNEXPLORED_SHADE = 0.25
+
+
+class PngWriter:
+
+    ''' Writes an 8 bit RGB PNG to a binary file, rows are given top to bottom with write_rows '''
+
+    def __init__(self, file, width, height, level=6):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows = 0
+
+        self.compressor = zlib.compressobj(level)
+        self.pending = []
+        self.pending_size = 0
+
+        self.file.write(PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def write_rows(self, rows):
+        ''' writes a (n, width, 3) uint8 array of rows '''
+        rows = numpy.ascontiguousarray(rows, numpy.uint8).reshape(-1, self.width * 3)
+
+        # every row starts with its filter type, 0 for none
+        filtered = numpy.zeros((len(rows), self.width * 3 + 1), numpy.uint8)
+        filtered[:, 1:] = rows
+        self._compressed(self.compressor.compress(filtered.tobytes()))
+        self.rows += len(rows)
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError('PngWriter: {} rows written out of {}'.format(self.rows, self.height))
+        self._compressed(self.compressor.flush())
+        self._flush()
+        self._chunk(b'IEND', b'')
+
+    def _compressed(self, data):
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= IDAT_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.pending_size:
+            self._chunk(b'IDAT', b''.join(self.pending))
+        self.pending = []
+        self.pending_size = 0
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+
+def bounds(game_map):
+    ''' returns the Rect of the chunks holding written locations, None for an empty map '''
+    keys = list(game_map.opacity)
+    if not keys:
+        return None
+
+    x1 = min(key[0] for key in keys) << utils.CHUNK_SHIFT
+    y1 = min(key[1] for key in keys) << utils.CHUNK_SHIFT
+    x2 = (max(key[0] for key in keys) + 1) << utils.CHUNK_SHIFT
+    y2 = (max(key[1] for key in keys) + 1) << utils.CHUNK_SHIFT
+    return utils.Rect(x1, y1, x2 - x1, y2 - y1)
+
+
+def rows(game_map, rect, explored=None, band=utils.CHUNK_SIZE):
+    ''' yields the colors of the locations of rect as (n, width, 3) arrays of up to band rows,
+        top row first. With explored, a utils.LocationSet, the locations outside of it are darkened.
+    '''
+    width = rect.x2 - rect.x1
+    default = color.rgb(game_map.default.color) if game_map.default is not None else (0, 0, 0)
+
+    if explored is not None:
+        explored = numpy.sort(numpy.fromiter(explored.keys, numpy.int64, len(explored)))
+
+    for top in range(rect.y2, rect.y1, -band):
+        ys = range(top - 1, max(top - band, rect.y1) - 1, -1)
+
+        # the identities of the tiles of the band, the colors are looked up once per distinct tile
+        tiles = []
+        identities = numpy.empty((len(ys), width), numpy.int64)
+        for i, y in enumerate(ys):
+            row = game_map.tile_row(rect.x1, y, width)
+            identities[i] = list(map(id, row))
+            tiles.append(row)
+
+        unique, first, inverse = numpy.unique(identities, return_index=True, return_inverse=True)
+        palette = numpy.empty((len(unique), 3), numpy.uint8)
+        for i, index in enumerate(first.tolist()):
+            tile = tiles[index // width][index % width]
+            palette[i] = default if tile is None else color.rgb(tile.color)
+        colors = palette[inverse.reshape(len(ys), width)]
+
+        if explored is not None:
+            keys = (numpy.array(ys, numpy.int64)[:, None] << utils.PACK_SHIFT) + numpy.arange(rect.x1, rect.x2)
+            index = numpy.minimum(numpy.searchsorted(explored, keys), max(len(explored) - 1, 0))
+            known = explored[index] == keys if len(explored) else numpy.zeros(keys.shape, bool)
+            colors[~known] = (colors[~known] * UNEXPLORED_SHADE).astype(numpy.uint8)
+
+        yield colors
+
+
+def export(game_map, path, rect=None, explored=None, scale=1):
+    ''' writes the locations of rect, the whole map by default, to a PNG file at path.
+        A pixel holds the average color of scale * scale locations, explored as in rows.
+        Returns the (width, height) of the image.
+    '''
+    rect = rect or bounds(game_map)
+    if rect is None:
+        raise ValueError('export: the map is empty')
+
+    # round the rect up to whole pixels
+    width = math.ceil((rect.x2 - rect.x1) / scale)
+    height = math.ceil((rect.y2 - rect.y1) / scale)
+    rect = utils.Rect(rect.x1, rect.y2 - height * scale, width * scale, height * scale)
+
+    # bands of whole pixels, at least a chunk high
+    band = scale * max(1, utils.CHUNK_SIZE // scale)
+
+    with open(path, 'wb') as file:
+        writer = PngWriter(file, width, height)
+        for colors in rows(game_map, rect, explored, band):
+            if scale > 1:
+                blocks = colors.reshape(len(colors) // scale, scale, width, scale, 3)
+                colors = blocks.mean(axis=(1, 3), dtype=numpy.float32).astype(numpy.uint8)
+            writer.write_rows(colors)
+        writer.close()
+
+    return width, height
+
+
+def thumbnail(game_map, path, size=256, rect=None, explored=None):
+    ''' writes a PNG of the map, see export, scaled down to at most size pixels a side '''
+    rect = rect or bounds(game_map)
+    if rect is None:
+        raise ValueError('thumbnail: the map is empty')
+
+    scale = max(1, math.ceil(max(rect.x2 - rect.x1, rect.y2 - rect.y1) / size))
+    return export(game_map, path, rect, explored, scale)
@@ -0,0 +1,459 @@
+''' Height maps without libtcod, with the functions of the libtcodpy heightmap module.
+    A HeightMap holds a float32 array of heights indexed [y, x], and every heightmap_*
+    function keeps the name, arguments and semantics of its libtcodpy counterpart but
+    works on the whole array at once. The few differences are noted on the functions:
+    random numbers come from NumPy, so seeds don't reproduce libtcod terrain.
+'''
+
+import math
+
+import numpy
+
+# the 8-connected neighbourhood, in the order libtcod scans it
+DX = (-1, 0, 1, -1, 1, -1, 0, 1)
+DY = (-1, -1, -1, 0, 0, 1, 1, 1)
+
+# rain drops flowing together in heightmap_rain_erosion
+EROSION_BATCH = 1024
+
+# upper bound of the number of (cell, point) distances computed at once by heightmap_add_voronoi
+VORONOI_BLOCK = 1 << 22
+
+_random = numpy.random.default_rng()
+
+
+def _rng(rnd):
+    # the generator of a rnd argument: 0 or None for the shared one, a seed or a numpy Generator
+    if rnd is None or isinstance(rnd, int) and rnd == 0:
+        return _random
+    if isinstance(rnd, numpy.random.Generator):
+        return rnd
+    return numpy.random.default_rng(rnd)
+
+
+class HeightMap:
+
+    ''' A w * h grid of heights, values is indexed [y, x] '''
+
+    def __init__(self, w, h):
+        self.values = numpy.zeros((h, w), numpy.float32)
+
+    @property
+    def w(self):
+        return self.values.shape[1]
+
+    @property
+    def h(self):
+        return self.values.shape[0]
+
+    def bands(self, levels):
+        ''' returns the uint8 index of the first of the ascending levels at or above every height,
+            len(levels) for the heights above all of them. See Map.Terrain.
+        '''
+        return numpy.searchsorted(numpy.asarray(levels, numpy.float32), self.values).astype(numpy.uint8)
+
+
+def heightmap_new(w, h):
+    return HeightMap(w, h)
+
+
+def heightmap_set_value(hm, x, y, value):
+    hm.values[y, x] = value
+
+
+def heightmap_add(hm, value):
+    hm.values += value
+
+
+def heightmap_scale(hm, value):
+    hm.values *= value
+
+
+def heightmap_clear(hm):
+    hm.values[:] = 0
+
+
+def heightmap_clamp(hm, mi, ma):
+    numpy.clip(hm.values, mi, ma, out=hm.values)
+
+
+def heightmap_copy(hm1, hm2):
+    ''' copies hm1 into hm2 '''
+    hm2.values[:] = hm1.values
+
+
+def heightmap_normalize(hm, mi=0.0, ma=1.0):
+    ''' linearly rescales the heights to [mi, ma], a flat map is set to mi '''
+    low, high = heightmap_get_minmax(hm)
+    coef = (ma - mi) / (high - low) if high > low else 0.0
+    hm.values -= low
+    hm.values *= coef
+    hm.values += mi
+
+
+def heightmap_lerp_hm(hm1, hm2, hm3, coef):
+    ''' hm3 = hm1 + (hm2 - hm1) * coef '''
+    hm3.values[:] = hm1.values + (hm2.values - hm1.values) * coef
+
+
+def heightmap_add_hm(hm1, hm2, hm3):
+    numpy.add(hm1.values, hm2.values, out=hm3.values)
+
+
+def heightmap_multiply_hm(hm1, hm2, hm3):
+    numpy.multiply(hm1.values, hm2.values, out=hm3.values)
+
+
+def _hill(hm, x, y, radius):
+    # the cells of the bounding box of a hill, the libtcod bounds truncate towards zero,
+    # and their squared distances to its center
+    x1, x2 = int(max(0, x - radius)), int(min(hm.w, x + radius))
+    y1, y2 = int(max(0, y - radius)), int(min(hm.h, y + radius))
+    cells = (slice(y1, max(y1, y2)), slice(x1, max(x1, x2)))
+
+    xs = numpy.arange(x1, max(x1, x2), dtype=numpy.float32) - x
+    ys = numpy.arange(y1, max(y1, y2), dtype=numpy.float32) - y
+    return cells, ys[:, None] ** 2 + xs ** 2
+
+
+def heightmap_add_hill(hm, x, y, radius, height):
+    ''' adds a paraboloid of the given radius peaking at height over (x, y) '''
+    cells, distance = _hill(hm, x, y, radius)
+    z = radius * radius - distance
+    hm.values[cells] += numpy.where(z > 0, z * (height / (radius * radius)), 0)
+
+
+def heightmap_dig_hill(hm, x, y, radius, height):
+    ''' raises the heights under the paraboloid of add_hill to it, or lowers those
+        above it for a negative height, so digging the same hill twice changes nothing.
+    '''
+    cells, distance = _hill(hm, x, y, radius)
+    z = numpy.where(distance < radius * radius, (radius * radius - distance) * (height / (radius * radius)),
+                    -numpy.inf if height > 0 else numpy.inf)
+    values = hm.values[cells]
+    hm.values[cells] = numpy.maximum(values, z) if height > 0 else numpy.minimum(values, z)
+
+
+def heightmap_mid_point_displacement(hm, rng, roughness):
+    ''' fills the map with diamond-square terrain whose displacement shrinks by roughness at every level.
+        Only the (2^n + 1) square in the bottom left corner of the map is written, like libtcod,
+        and every level is computed at once. Points on the border of the square average their
+        3 neighbours inside it where libtcod reads a 4th one on the far borders.
+    '''
+    random = _rng(rng)
+    size = min(hm.w, hm.h) - 1
+    if size < 1 or size & (size - 1):
+        raise ValueError('heightmap_mid_point_displacement: the map must be 2^n + 1 cells wide')
+
+    values = hm.values[:size + 1, :size + 1]
+    values[::size, ::size] = random.uniform(0, 1, (2, 2))
+
+    offset = 1.0
+    step = size
+    while step > 1:
+        half = step // 2
+
+        # diamond step, the center of every square is the average of its corners
+        corners = values[:-1:step, :-1:step] + values[:-1:step, step::step] + values[step::step, :-1:step] + values[step::step, step::step]
+        values[half::step, half::step] = corners * 0.25 + random.uniform(-offset, offset, corners.shape)
+        offset *= roughness
+
+        # square step, the middle of every edge is the average of the centers and corners around it
+        for ys, xs in ((numpy.arange(0, size + 1, step), numpy.arange(half, size, step)),
+                       (numpy.arange(half, size, step), numpy.arange(0, size + 1, step))):
+            ys, xs = numpy.meshgrid(ys, xs, indexing='ij')
+            total = numpy.zeros(ys.shape, numpy.float32)
+            count = numpy.zeros(ys.shape, numpy.float32)
+            for dy, dx in ((-half, 0), (half, 0), (0, -half), (0, half)):
+                ny, nx = ys + dy, xs + dx
+                inside = (ny >= 0) & (ny <= size) & (nx >= 0) & (nx <= size)
+                total += numpy.where(inside, values[numpy.clip(ny, 0, size), numpy.clip(nx, 0, size)], 0)
+                count += inside
+            values[ys, xs] = total / count + random.uniform(-offset, offset, ys.shape)
+
+        step = half
+
+
+def heightmap_rain_erosion(hm, nbDrops, erosionCoef, sedimentationCoef, rnd=0):
+    ''' drops nbDrops rain drops at random cells. Every drop flows down the steepest slope,
+        eroding erosionCoef * slope from each cell it leaves and carrying it away, and leaves
+        sedimentationCoef times the sum of the slopes it went down where it stops.
+        Drops flow together in batches of EROSION_BATCH instead of one after the other,
+        a step of every drop of a batch at a time, which gives libtcod results for batches of 1.
+    '''
+    random = _rng(rnd)
+    h, w = hm.values.shape
+    flat = hm.values.reshape(-1)
+    dx, dy = numpy.array(DX), numpy.array(DY)
+
+    while nbDrops > 0:
+        n = min(nbDrops, EROSION_BATCH)
+        nbDrops -= n
+
+        xs = random.integers(0, w, n)
+        ys = random.integers(0, h, n)
+        sediment = numpy.zeros(n, numpy.float32)
+
+        # each step moves every drop lower, the map can't take more steps than it has cells
+        for _ in range(w * h):
+            nx, ny = xs[:, None] + dx, ys[:, None] + dy
+            inside = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+            heights = numpy.where(inside, flat[numpy.clip(ny, 0, h - 1) * w + numpy.clip(nx, 0, w - 1)], numpy.inf)
+
+            # the first lowest neighbour, as libtcod keeps the first of equal slopes
+            lowest = heights.argmin(axis=1)
+            slope = flat[ys * w + xs] - heights[numpy.arange(len(xs)), lowest]
+
+            stops = ~(slope > 0)
+            if stops.any():
+                numpy.add.at(flat, ys[stops] * w + xs[stops], sedimentationCoef * sediment[stops])
+
+            flows = ~stops
+            if not flows.any():
+                break
+            xs, ys, slope, lowest, sediment = xs[flows], ys[flows], slope[flows], lowest[flows], sediment[flows]
+            numpy.subtract.at(flat, ys * w + xs, erosionCoef * slope)
+            sediment += slope
+            xs = xs + dx[lowest]
+            ys = ys + dy[lowest]
+
+
+def heightmap_kernel_transform(hm, kernelsize, dx, dy, weight, minLevel, maxLevel):
+    ''' replaces every height in [minLevel, maxLevel] by the weighted average of the cells
+        at its kernelsize (dx[i], dy[i]) offsets that are inside the map.
+        All the averages are taken over the heights from before the transform, like recent
+        libtcod versions, where libtcod 1.5 overwrote the heights in place as it went.
+    '''
+    h, w = hm.values.shape
+    radius = max(max(map(abs, dx[:kernelsize]), default=0), max(map(abs, dy[:kernelsize]), default=0))
+    padded = numpy.pad(hm.values, radius)
+    inside = numpy.pad(numpy.ones((h, w), numpy.float32), radius)
+
+    total = numpy.zeros((h, w), numpy.float32)
+    weights = numpy.zeros((h, w), numpy.float32)
+    for i in range(kernelsize):
+        cells = (slice(radius + dy[i], radius + dy[i] + h), slice(radius + dx[i], radius + dx[i] + w))
+        total += weight[i] * padded[cells]
+        weights += weight[i] * inside[cells]
+
+    values = hm.values
+    selected = (values >= minLevel) & (values <= maxLevel)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        values[selected] = (total / weights)[selected]
+
+
+def heightmap_add_voronoi(hm, nbPoints, nbCoef, coef, rnd=0):
+    ''' picks nbPoints random points and adds coef[i] times the squared distance to the i-th
+        closest of them to every height, for the nbCoef first coefficients.
+    '''
+    if nbPoints <= 0:
+        return
+    random = _rng(rnd)
+    h, w = hm.values.shape
+    nbCoef = min(nbCoef, nbPoints)
+    coef = numpy.asarray(coef[:nbCoef], numpy.float32)
+
+    px = random.integers(0, w, nbPoints).astype(numpy.float32)
+    py = random.integers(0, h, nbPoints).astype(numpy.float32)
+    xs = numpy.arange(w, dtype=numpy.float32)
+
+    # bands of rows, so the distances of all cells to all points are never held at once
+    band = max(1, VORONOI_BLOCK // (w * nbPoints))
+    for y1 in range(0, h, band):
+        ys = numpy.arange(y1, min(y1 + band, h), dtype=numpy.float32)
+        distance = (xs[None, :, None] - px) ** 2 + (ys[:, None, None] - py) ** 2
+        if nbCoef < nbPoints:
+            distance = numpy.partition(distance, nbCoef - 1, axis=-1)[..., :nbCoef]
+        distance.sort(axis=-1)
+        hm.values[y1:y1 + len(ys)] += distance[..., :nbCoef] @ coef
+
+
+def _fbm(hm, noise, mulx, muly, addx, addy, octaves):
+    # the fbm of noise over the map, at the coordinates libtcod samples it at.
+    # noise is duck typed: an object with a get_fbm(f, octaves) method evaluating an array
+    # of coordinates whose last axis holds (x, y) at once, or a libtcod noise sampled
+    # one point at a time through libtcodpy
+    h, w = hm.values.shape
+    f = numpy.empty((h, w, 2), numpy.float32)
+    f[..., 0] = (numpy.arange(w, dtype=numpy.float32) + addx) * (mulx / w)
+    f[..., 1] = ((numpy.arange(h, dtype=numpy.float32) + addy) * (muly / h))[:, None]
+
+    if hasattr(noise, 'get_fbm'):
+        return numpy.asarray(noise.get_fbm(f, octaves), numpy.float32)
+
+    import libtcodpy
+    values = [libtcodpy.noise_get_fbm(noise, point, octaves) for point in f.reshape(-1, 2).tolist()]
+    return numpy.array(values, numpy.float32).reshape(h, w)
+
+
+def heightmap_add_fbm(hm, noise, mulx, muly, addx, addy, octaves, delta, scale):
+    ''' adds delta + scale * fbm to every height, the fbm of cell (x, y) is sampled
+        at ((x + addx) * mulx / w, (y + addy) * muly / h). See _fbm for the noise.
+    '''
+    hm.values += delta + _fbm(hm, noise, mulx, muly, addx, addy, octaves) * scale
+
+
+def heightmap_scale_fbm(hm, noise, mulx, muly, addx, addy, octaves, delta, scale):
+    ''' multiplies every height by delta + scale * fbm, sampled as in add_fbm '''
+    hm.values *= delta + _fbm(hm, noise, mulx, muly, addx, addy, octaves) * scale
+
+
+def heightmap_dig_bezier(hm, px, py, startRadius, startDepth, endRadius, endDepth):
+    ''' digs hills along the cubic bezier curve of control points (px[i], py[i]),
+        their radius and depth going from the start values to the end values.
+    '''
+    t = numpy.arange(0, 1.0005, 0.001)
+    it = 1 - t
+    xs = (px[0] * it ** 3 + 3 * px[1] * t * it ** 2 + 3 * px[2] * t ** 2 * it + px[3] * t ** 3).astype(int)
+    ys = (py[0] * it ** 3 + 3 * py[1] * t * it ** 2 + 3 * py[2] * t ** 2 * it + py[3] * t ** 3).astype(int)
+
+    # a hill wherever the curve enters a new cell, libtcod skips its first control point
+    moves = numpy.flatnonzero((numpy.diff(xs, prepend=px[0]) != 0) | (numpy.diff(ys, prepend=py[0]) != 0))
+    for i in moves.tolist():
+        heightmap_dig_hill(hm, float(xs[i]), float(ys[i]),
+                           startRadius + (endRadius - startRadius) * t[i], startDepth + (endDepth - startDepth) * t[i])
+
+
+def heightmap_get_value(hm, x, y):
+    return float(hm.values[y, x])
+
+
+def heightmap_get_interpolated_value(hm, x, y):
+    ''' returns the bilinear interpolation of the heights around (x, y) '''
+    ix, iy = int(x), int(y)
+    if ix >= hm.w - 1 or iy >= hm.h - 1:
+        return heightmap_get_value(hm, ix, iy)
+
+    dx, dy = x - ix, y - iy
+    (c1, c2), (c3, c4) = hm.values[iy:iy + 2, ix:ix + 2].tolist()
+    top = (1 - dx) * c1 + dx * c2
+    bottom = (1 - dx) * c3 + dx * c4
+    return (1 - dy) * top + dy * bottom
+
+
+def heightmap_get_slope(hm, x, y):
+    ''' returns the slope at (x, y) in radians, from its steepest rise and its steepest fall '''
+    value = hm.values[y, x]
+    rise = fall = 0.0
+    for dx, dy in zip(DX, DY):
+        if 0 <= x + dx < hm.w and 0 <= y + dy < hm.h:
+            slope = float(hm.values[y + dy, x + dx] - value)
+            if slope > rise:
+                rise = slope
+            elif slope < fall:
+                fall = slope
+    return math.atan2(rise + fall, 1.0)
+
+
+def heightmap_get_normal(hm, x, y, waterLevel):
+    ''' returns the normal of the surface at (x, y), the heights under waterLevel being
+        raised to it, (0, 0, 1) on the last row and column
+    '''
+    if x >= hm.w - 1 or y >= hm.h - 1:
+        return 0.0, 0.0, 1.0
+
+    h0 = max(heightmap_get_interpolated_value(hm, x, y), waterLevel)
+    hx = max(heightmap_get_interpolated_value(hm, x + 1, y), waterLevel)
+    hy = max(heightmap_get_interpolated_value(hm, x, y + 1), waterLevel)
+
+    normal = (255 * (h0 - hx), 255 * (h0 - hy), 16.0)
+    length = math.sqrt(sum(n * n for n in normal))
+    return tuple(n / length for n in normal)
+
+
+def heightmap_count_cells(hm, mi, ma):
+    ''' returns the number of heights in [mi, ma] '''
+    return int(numpy.count_nonzero((hm.values >= mi) & (hm.values <= ma)))
+
+
+def heightmap_has_land_on_border(hm, waterlevel):
+    values = hm.values
+    return bool((values[0] > waterlevel).any() or (values[-1] > waterlevel).any()
+                or (values[:, 0] > waterlevel).any() or (values[:, -1] > waterlevel).any())
+
+
+def heightmap_get_minmax(hm):
+    return float(hm.values.min()), float(hm.values.max())
+
+
+def heightmap_delete(hm):
+    pass
+
+
+if __name__ == '__main__':
+
+    # benchmark against straight ports of the libtcod loops, which are also checked to agree
+    import time
+
+    def reference_add_hill(values, hx, hy, radius, height):
+        h, w = len(values), len(values[0])
+        radius2 = radius * radius
+        coef = height / radius2
+        for x in range(int(max(0, hx - radius)), int(min(w, hx + radius))):
+            xdist = (x - hx) * (x - hx)
+            for y in range(int(max(0, hy - radius)), int(min(h, hy + radius))):
+                z = radius2 - xdist - (y - hy) * (y - hy)
+                if z > 0:
+                    values[y][x] += z * coef
+
+    def reference_kernel_transform(values, dx, dy, weight, low, high):
+        h, w = len(values), len(values[0])
+        source = [row[:] for row in values]
+        for y in range(h):
+            for x in range(w):
+                if low <= source[y][x] <= high:
+                    total = weights = 0.0
+                    for i in range(len(dx)):
+                        nx, ny = x + dx[i], y + dy[i]
+                        if 0 <= nx < w and 0 <= ny < h:
+                            total += weight[i] * source[ny][nx]
+                            weights += weight[i]
+                    values[y][x] = total / weights
+
+    def reference_normalize(values, mi, ma):
+        low = min(map(min, values))
+        high = max(map(max, values))
+        coef = (ma - mi) / (high - low) if high > low else 0.0
+        for row in values:
+            for x in range(len(row)):
+                row[x] = mi + (row[x] - low) * coef
+
+    def reference_count_cells(values, mi, ma):
+        return sum(mi <= value <= ma for row in values for value in row)
+
+    def timed(function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        return time.perf_counter() - start, result
+
+    size = 256
+    hills = [(x * 37 % size, x * 91 % size, 4 + x % 20, 0.5 + x % 3) for x in range(200)]
+    smooth = ([-1, 0, 1, -1, 0, 1, -1, 0, 1], [-1, -1, -1, 0, 0, 0, 1, 1, 1], [1, 2, 1, 2, 20, 2, 1, 2, 1])
+
+    hm = heightmap_new(size, size)
+    reference = [[0.0] * size for _ in range(size)]
+    steps = [
+        ('add_hill x{}'.format(len(hills)),
+         lambda: [heightmap_add_hill(hm, *hill) for hill in hills],
+         lambda: [reference_add_hill(reference, *hill) for hill in hills]),
+        ('normalize', lambda: heightmap_normalize(hm), lambda: reference_normalize(reference, 0.0, 1.0)),
+        ('kernel_transform', lambda: heightmap_kernel_transform(hm, 9, *smooth, 0.0, 0.8),
+         lambda: reference_kernel_transform(reference, *smooth, 0.0, 0.8)),
+        ('count_cells', lambda: heightmap_count_cells(hm, 0.2, 0.6), lambda: reference_count_cells(reference, 0.2, 0.6)),
+    ]
+
+    print('{}x{} map'.format(size, size))
+    for name, vectorized, loops in steps:
+        fast, fast_result = timed(vectorized)
+        slow, slow_result = timed(loops)
+        error = float(numpy.abs(hm.values - numpy.array(reference, numpy.float32)).max())
+        print('{:<16} numpy {:8.2f}ms  python {:8.2f}ms  x{:<7.0f} max error {:.1e}'.format(
+            name, fast * 1000, slow * 1000, slow / fast, error))
+        if name == 'count_cells':
+            print('{:<16} {} cells, reference {}'.format('', fast_result, slow_result))
+
+    hm = heightmap_new(1024, 1024)
+    for name, function in (('add_voronoi 64', lambda: heightmap_add_voronoi(hm, 64, 3, [-1, 0.5, 0.2], 1)),
+                           ('rain_erosion 10000', lambda: heightmap_rain_erosion(hm, 10000, 0.1, 0.05, 1)),
+                           ('mid_point 1025', lambda: heightmap_mid_point_displacement(heightmap_new(1025, 1025), 1, 0.5))):
+        print('{:<18} 1024x1024 {:8.2f}ms'.format(name, timed(function)[0] * 1000))
@@ -0,0 +1,128 @@
+import bisect
+import weakref
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+
+class MapJournal:
+
+    ''' A journal of the edits made to a map.
+        Every edit bumps the version and is recorded as the rects of locations it wrote,
+        subscribers pull the edits made since the last version they have seen,
+        coalesced into a single dirty rect per chunk or as the rects themselves.
+    '''
+
+    def __init__(self):
+        self.version = 0
+
+        # the oldest version changes can still be reported from
+        self.base = 0
+
+        # rects of the edits as (version, x1, y1, x2, y2), ordered by version
+        self.entries = []
+        self.subscribers = weakref.WeakSet()
+
+    def record(self, rect):
+        ''' records an edit of all locations inside rect, returns the new version '''
+        return self._append([(rect.x1, rect.y1, rect.x2, rect.y2)])
+
+    def record_cell(self, location):
+        ''' records an edit of a single location, returns the new version '''
+        x, y = location
+        return self._append([(x, y, x + 1, y + 1)])
+
+    def record_rects(self, rects):
+        ''' records a single edit of the locations inside several (x1, y1, x2, y2) rects,
+            such as the runs of a row, returns the new version
+        '''
+        return self._append(rects)
+
+    def _append(self, rects):
+        self.version += 1
+        if self.subscribers:
+            version = self.version
+            self.entries.extend((version, x1, y1, x2, y2) for x1, y1, x2, y2 in rects)
+        else:
+            # nobody will ever ask for older edits
+            self.base = self.version
+            if self.entries:
+                self.entries.clear()
+        return self.version
+
+    def changes_since(self, version):
+        ''' returns a dictionary of chunk keys to the Rect of locations edited in that chunk
+            after version. Returns None if the journal no longer holds the edits made
+            since version, in which case everything should be treated as changed.
+        '''
+        if version < self.base:
+            return None
+
+        changes = {}
+        start = bisect.bisect_right(self.entries, (version, float('inf')))
+
+        for _, x1, y1, x2, y2 in self.entries[start:]:
+            for cx in range(x1 >> utils.CHUNK_SHIFT, ((x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                for cy in range(y1 >> utils.CHUNK_SHIFT, ((y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                    # clip the edit to the chunk
+                    left = max(x1, cx << utils.CHUNK_SHIFT)
+                    bottom = max(y1, cy << utils.CHUNK_SHIFT)
+                    right = min(x2, (cx + 1) << utils.CHUNK_SHIFT)
+                    top = min(y2, (cy + 1) << utils.CHUNK_SHIFT)
+                    rect = utils.Rect(left, bottom, right - left, top - bottom)
+
+                    key = (cx, cy)
+                    if key in changes:
+                        rect = changes[key].union(rect)
+                    changes[key] = rect
+
+        return changes
+
+    def edits_since(self, version):
+        ''' returns the (x1, y1, x2, y2) rects of the locations edited after version, in the
+            order they were written, or None like changes_since.
+        '''
+        if version < self.base:
+            return None
+
+        start = bisect.bisect_right(self.entries, (version, float('inf')))
+        return [entry[1:] for entry in self.entries[start:]]
+
+    def subscribe(self):
+        ''' returns a new Subscription starting at the current version '''
+        subscription = Subscription(self)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def trim(self):
+        ''' forgets the edits every subscriber has already pulled '''
+        oldest = min((subscriber.version for subscriber in self.subscribers), default=self.version)
+        start = bisect.bisect_right(self.entries, (oldest, float('inf')))
+        if start:
+            del self.entries[:start]
+        self.base = max(self.base, oldest)
+
+
+class Subscription:
+
+    ''' A consumer of a MapJournal, remembering the last version it has seen '''
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.version = journal.version
+
+    def pull(self):
+        ''' returns the changes made since the last pull, see MapJournal.changes_since '''
+        changes = self.journal.changes_since(self.version)
+        self.version = self.journal.version
+        self.journal.trim()
+        return changes
+
+    def pull_edits(self):
+        ''' returns the rects edited since the last pull, see MapJournal.edits_since '''
+        edits = self.journal.edits_since(self.version)
+        self.version = self.journal.version
+        self.journal.trim()
+        return edits
@@ -0,0 +1,152 @@
+''' Point light sources lighting up a Map.
+    Every light keeps its contribution to the chunks it reaches as NumPy arrays,
+    static lights are summed once into a cached light map per chunk while dynamic
+    lights are recomputed only when they move or the map journal reports an edit
+    within their radius. The light of a chunk is the sum of the arrays reaching it.
+'''
+
+import numpy
+
+try:
+    from . import utils
+    from . import raycast as rc
+except ImportError:
+    import utils
+    import raycast as rc
+
+
+class Light:
+
+    ''' A point light, its intensity fades from intensity at its location to 0 at radius.
+        falloff is the exponent of the fade, 1 fades linearly. radius must be at least 1.
+    '''
+
+    def __init__(self, location, radius, intensity=1.0, falloff=1.0, static=True):
+        if radius < 1:
+            raise ValueError('Light: radius {} is smaller than 1'.format(radius))
+        self.location = location
+        self.radius = radius
+        self.intensity = intensity
+        self.falloff = falloff
+        self.static = static
+
+    def reach(self, location=None):
+        ''' returns the Rect of locations the light can reach from location, its own location by default '''
+        x, y = self.location if location is None else location
+        return utils.Rect(x - self.radius, y - self.radius, 2 * self.radius + 1, 2 * self.radius + 1)
+
+    def __str__(self):
+        return "Light: {} {} {}".format(self.location, self.radius, self.intensity)
+
+
+class Lighting:
+
+    ''' The combined light of many Lights over a map '''
+
+    def __init__(self, game_map):
+        self.map = game_map
+        self.subscription = self.map.journal.subscribe()
+
+        # light -> (location computed at, {chunk key: contribution})
+        self.contributions = {}
+
+        # chunk key -> summed contribution of the static and of the dynamic lights
+        self.static = {}
+        self.dynamic = {}
+
+        # incremented whenever the light changes, so renderers know when to shade again
+        self.version = 0
+
+    def add(self, light):
+        self.contributions[light] = self.compute(light)
+        self._accumulate(light, 1)
+        self.version += 1
+
+    def remove(self, light):
+        self._accumulate(light, -1)
+        del self.contributions[light]
+        self.version += 1
+
+    def compute(self, light):
+        ''' casts rays from light and returns its contribution per chunk '''
+        keys = numpy.unique(numpy.array(rc.cast_rays(light, self.map, light.radius, packed=True), dtype=numpy.int64))
+        if not len(keys):
+            return tuple(light.location), {}
+
+        # unpack the keys, see utils.unpack
+        xs = ((keys + utils.PACK_OFFSET) & utils.PACK_MASK) - utils.PACK_OFFSET
+        ys = (keys - xs) >> utils.PACK_SHIFT
+        distance = numpy.hypot(xs - light.location[0], ys - light.location[1])
+        values = light.intensity * numpy.clip(1 - distance / light.radius, 0, 1) ** light.falloff
+
+        chunks = {}
+        keys = (xs >> utils.CHUNK_SHIFT) * (1 << 32) + (ys >> utils.CHUNK_SHIFT)
+        for key in numpy.unique(keys):
+            mask = keys == key
+            chunk = numpy.zeros((utils.CHUNK_SIZE, utils.CHUNK_SIZE), numpy.float32)
+            chunk[ys[mask] & (utils.CHUNK_SIZE - 1), xs[mask] & (utils.CHUNK_SIZE - 1)] = values[mask]
+            chunks[utils.chunk_key((int(xs[mask][0]), int(ys[mask][0])))] = chunk
+
+        return tuple(light.location), chunks
+
+    def _accumulate(self, light, sign):
+        # adds (or removes) the contribution of a light to the summed light maps
+        sums = self.static if light.static else self.dynamic
+        for key, chunk in self.contributions[light][1].items():
+            if key in sums:
+                sums[key] += sign * chunk
+            else:
+                sums[key] = sign * chunk
+
+    def update(self):
+        ''' recomputes the lights that moved or that reach an edited part of the map '''
+        changes = self.subscription.pull()
+
+        for light, (location, _) in list(self.contributions.items()):
+            moved = tuple(light.location) != location
+            if changes is None or moved or self._touches(light.reach(location), changes):
+                self._accumulate(light, -1)
+                self.contributions[light] = self.compute(light)
+                self._accumulate(light, 1)
+                self.version += 1
+
+    def _touches(self, reach, changes):
+        # true if an edit lies inside reach
+        for cx in range(reach.x1 >> utils.CHUNK_SHIFT, ((reach.x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+            for cy in range(reach.y1 >> utils.CHUNK_SHIFT, ((reach.y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                rect = changes.get((cx, cy))
+                if rect is not None and rect.intersects(reach):
+                    return True
+        return False
+
+    def chunk(self, key):
+        ''' returns the light of a chunk as a CHUNK_SIZE * CHUNK_SIZE array, indexed [y, x] '''
+        light = numpy.zeros((utils.CHUNK_SIZE, utils.CHUNK_SIZE), numpy.float32)
+        if key in self.static:
+            light += self.static[key]
+        if key in self.dynamic:
+            light += self.dynamic[key]
+        return light
+
+    def window(self, rect):
+        ''' returns the light of every location inside rect as an array indexed [y - rect.y1, x - rect.x1] '''
+        self.update()
+
+        window = numpy.zeros((rect.y2 - rect.y1, rect.x2 - rect.x1), numpy.float32)
+        for cx in range(rect.x1 >> utils.CHUNK_SHIFT, ((rect.x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+            for cy in range(rect.y1 >> utils.CHUNK_SHIFT, ((rect.y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                left = max(rect.x1, cx << utils.CHUNK_SHIFT)
+                right = min(rect.x2, (cx + 1) << utils.CHUNK_SHIFT)
+                bottom = max(rect.y1, cy << utils.CHUNK_SHIFT)
+                top = min(rect.y2, (cy + 1) << utils.CHUNK_SHIFT)
+
+                chunk = self.chunk((cx, cy))
+                window[bottom - rect.y1:top - rect.y1, left - rect.x1:right - rect.x1] = \
+                    chunk[bottom - (cy << utils.CHUNK_SHIFT):top - (cy << utils.CHUNK_SHIFT),
+                          left - (cx << utils.CHUNK_SHIFT):right - (cx << utils.CHUNK_SHIFT)]
+        return window
+
+    def intensity(self, location):
+        ''' returns the light at a single location '''
+        x, y = location
+        return float(self.window(utils.Rect(x, y, 1, 1))[0, 0])
@@ -0,0 +1,106 @@
+''' Line of sight queries between pairs of locations.
+    Lines are walked with integer arithmetic over the opacity bitmaps of a Map,
+    always from the smaller of the two locations, so a line and its reverse
+    visit the same cells and a single cache entry answers both directions.
+'''
+
+import numpy
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+
+def line(start, end):
+    ''' returns the cells of the line from start to end, both included '''
+    x0, y0 = start
+    dx, dy = end[0] - x0, end[1] - y0
+    steps = max(abs(dx), abs(dy))
+    if not steps:
+        return [tuple(start)]
+    # round every step to the closest cell, halves are rounded up
+    return [(x0 + (2 * dx * i + steps) // (2 * steps), y0 + (2 * dy * i + steps) // (2 * steps))
+            for i in range(steps + 1)]
+
+
+class LineOfSight:
+
+    ''' Answers whether two locations can see each other on a map.
+        A location sees another if no opaque tile lies strictly between them,
+        so walls are visible but nothing behind them is.
+        Results are cached by the unordered pair of locations and dropped
+        when the map journal reports an edit around their line.
+    '''
+
+    def __init__(self, game_map):
+        self.map = game_map
+        self.subscription = self.map.journal.subscribe()
+
+        # (location1, location2) with location1 <= location2 -> bool
+        self.cache = {}
+
+    @staticmethod
+    def key(a, b):
+        a, b = tuple(a), tuple(b)
+        return (a, b) if a <= b else (b, a)
+
+    def can_see(self, a, b):
+        self.update()
+
+        key = self.key(a, b)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.cache[key] = not any(self.map.is_opaque(x, y) for x, y in line(*key)[1:-1])
+        return result
+
+    def can_see_many(self, pairs):
+        ''' returns a list of can_see results for a sequence of (a, b) pairs.
+            The uncached lines are walked all at once over a single opacity window.
+        '''
+        self.update()
+
+        keys = [self.key(a, b) for a, b in pairs]
+        missing = list({key for key in keys if key not in self.cache})
+
+        if missing:
+            ends = numpy.array(missing, dtype=numpy.int64).reshape(-1, 4)
+            x0, y0, x1, y1 = ends.T
+            dx, dy = x1 - x0, y1 - y0
+            steps = numpy.maximum(numpy.abs(dx), numpy.abs(dy))
+
+            # the interior cells of every line, padded to the longest line
+            i = numpy.arange(1, max(int(steps.max()), 2))[None, :]
+            valid = i < steps[:, None]
+            divisor = 2 * numpy.maximum(steps, 1)[:, None]
+            xs = x0[:, None] + (2 * dx[:, None] * i + steps[:, None]) // divisor
+            ys = y0[:, None] + (2 * dy[:, None] * i + steps[:, None]) // divisor
+
+            left, bottom = int(ends[:, 0::2].min()), int(ends[:, 1::2].min())
+            rect = utils.Rect(left, bottom, int(ends[:, 0::2].max()) - left + 1, int(ends[:, 1::2].max()) - bottom + 1)
+            window = numpy.frombuffer(self.map.opacity_window(rect), numpy.uint8).reshape(rect.y2 - rect.y1, rect.x2 - rect.x1)
+
+            # padding cells point at the start of their line, which valid masks out anyway
+            xs = numpy.where(valid, xs, x0[:, None]) - left
+            ys = numpy.where(valid, ys, y0[:, None]) - bottom
+            blocked = (window[ys, xs].astype(bool) & valid).any(axis=1)
+
+            self.cache.update(zip(missing, (not value for value in blocked.tolist())))
+
+        return [self.cache[key] for key in keys]
+
+    def update(self):
+        ''' drops the cached lines passing near an edit of the map '''
+        changes = self.subscription.pull()
+        if changes is None:
+            self.cache.clear()
+            return
+        if not changes or not self.cache:
+            return
+
+        edits = list(changes.values())
+        for key in list(self.cache):
+            (x1, y1), (x2, y2) = key
+            bounds = utils.Rect(x1, min(y1, y2), x2 - x1 + 1, abs(y2 - y1) + 1)
+            if any(bounds.intersects(edit) for edit in edits):
+                del self.cache[key]
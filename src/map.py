@@ -1,13 +1,28 @@
 import math
+import heapq
 import random
+import multiprocessing
 
 # try a relative import of utils
 try:
     from . import utils
+    from . import journal
+    from . import connectivity
+    from . import bsp
 except SystemError:
     pass
 
 
+CHUNK_MASK = utils.CHUNK_SIZE - 1
+CHUNK_AREA = utils.CHUNK_SIZE * utils.CHUNK_SIZE
+
+# the largest width to height ratio of the leaves of the bsp layout of Map.Random
+BSP_RATIO = 1.5
+
+# the number of rooms per side of a region of Map.Partitioned considered to stitch it to its neighbours
+BORDER_ROOMS = 8
+
+
 class Tile:
     ''' A tile object holding the properties of a single tile
         as well as any Events that might occur in it
@@ -31,22 +46,143 @@ class Tile:
     def shallow_copy(self):
         return Tile(self.color, self.blocks, self.block_sight, self.events, self.dark_color)
 
+    def shared(self):
+        ''' returns a read only copy of the tile, that many locations can hold at once '''
+        return SharedTile(self.color, self.blocks, self.block_sight, self.events, self.dark_color)
+
     def __str__(self):
         return "Tile: {} {} {} {}".format(self.color, self.blocks, 'a' , self.events)
 
 
+class SharedTile(Tile):
+    ''' A read only tile, the form in which a Map stores the tiles written to it, see Map.
+        shallow_copy returns a Tile that can be modified.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        object.__setattr__(self, '_frozen', True)
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('SharedTile: {} is read only, write a new tile to the map instead'.format(name))
+        super().__setattr__(name, value)
+
+    def shared(self):
+        return self
+
+
+class TileGrid:
+
+    ''' The tiles written to a map, read like a dictionary keyed by locations packed into
+        int keys (see utils.pack), but stored as one list of CHUNK_SIZE * CHUNK_SIZE tiles per
+        chunk, laid out like the bitmaps of the map (see Map.bitmap_index), holding None for the
+        locations never written. Blocks of locations are written with a slice assignment per
+        chunk row, see TileGrid.write.
+    '''
+
+    def __init__(self):
+        # chunk key -> list of tiles
+        self.chunks = {}
+        self.count = 0
+
+    @staticmethod
+    def _locate(key):
+        # the chunk key and index inside its chunk of a packed key
+        x = ((key + utils.PACK_OFFSET) & utils.PACK_MASK) - utils.PACK_OFFSET
+        y = (key - x) >> utils.PACK_SHIFT
+        return (x >> utils.CHUNK_SHIFT, y >> utils.CHUNK_SHIFT), ((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)
+
+    def chunk(self, key):
+        ''' returns the list of tiles of the chunk of given key, creating it '''
+        tiles = self.chunks.get(key)
+        if tiles is None:
+            tiles = self.chunks[key] = [None] * CHUNK_AREA
+        return tiles
+
+    def write(self, key, start, tiles):
+        ''' writes a list of tiles into the chunk of given key from index start, None marking unwritten locations '''
+        chunk = self.chunk(key)
+        self.count += chunk[start:start + len(tiles)].count(None) - tiles.count(None)
+        chunk[start:start + len(tiles)] = tiles
+
+    def merge(self, other):
+        ''' adds the chunks of another TileGrid, which must not share any chunk with this one '''
+        self.chunks.update(other.chunks)
+        self.count += other.count
+
+    def get(self, key, default=None):
+        chunk_key, index = self._locate(key)
+        tiles = self.chunks.get(chunk_key)
+        tile = None if tiles is None else tiles[index]
+        return default if tile is None else tile
+
+    def __getitem__(self, key):
+        tile = self.get(key)
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __setitem__(self, key, tile):
+        chunk_key, index = self._locate(key)
+        self.write(chunk_key, index, [tile])
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (key for key, _ in self.items())
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (tile for _, tile in self.items())
+
+    def items(self):
+        ''' yields the (packed key, tile) pairs of the written locations, chunk by chunk '''
+        for (cx, cy), tiles in self.chunks.items():
+            for row in range(utils.CHUNK_SIZE):
+                row_key = (((cy << utils.CHUNK_SHIFT) + row) << utils.PACK_SHIFT) + (cx << utils.CHUNK_SHIFT)
+                for x, tile in enumerate(tiles[row << utils.CHUNK_SHIFT:(row + 1) << utils.CHUNK_SHIFT], row_key):
+                    if tile is not None:
+                        yield x, tile
+
+    def update(self, items):
+        ''' writes the tiles of a mapping or of (packed key, tile) pairs '''
+        if hasattr(items, 'items'):
+            items = items.items()
+        for key, tile in items:
+            self[key] = tile
+
+
 class Map:
 
     ''' A map object to handle the game world and player position
-        Keeps track of the world in a dictionary of Vector locations,
-        the value of each location should be a tile object.
+        Keeps track of the world in a TileGrid of locations packed into int keys
+        (see utils.pack), the value of each location should be a tile object.
+        Every write through the map is recorded in its journal.
+
+        The map stores read only copies of the tiles written to it (see Tile.shared),
+        shared by all the locations of a single write. Setting an attribute of a tile
+        read from the map raises AttributeError, the bitmaps below would miss the change:
+        a location is changed by writing a new tile to it.
+
+        Alongside the grid the map keeps dense opacity and walkability bitmaps,
+        one bytearray of CHUNK_SIZE * CHUNK_SIZE bytes per chunk, holding 1 for
+        opaque (or walkable) locations. Locations are stored row by row from the
+        bottom left corner of the chunk, see Map.bitmap_index.
     '''
 
     def __init__(self, initial_grid=None, rooms=None, default=None):
 
-        self.grid = initial_grid
-        if not self.grid:
-            self.grid = {}
+        # initial_grid is keyed by (x, y) locations
+        self.grid = TileGrid()
+        if initial_grid:
+            self.grid.update((utils.pack(location), _stored(tile)) for location, tile in initial_grid.items())
 
         self.rooms = rooms
         if not self.rooms:
@@ -54,14 +190,153 @@ class Map:
 
         self.default = default
 
+        self.journal = journal.MapJournal()
+
+        # chunk key -> bytearray, chunks that were never written fall back to the default tile
+        self.opacity = {}
+        self.walkability = {}
+        for location, tile in self.items():
+            self._set_bitmaps(location[0], location[1], tile)
+
+    @property
+    def version(self):
+        ''' the number of edits made to the map so far '''
+        return self.journal.version
+
     def __getitem__(self, key):
-        return self.grid.get(key, self.default)
+        x, y = key
+        tiles = self.grid.chunks.get((x >> utils.CHUNK_SHIFT, y >> utils.CHUNK_SHIFT))
+        tile = None if tiles is None else tiles[((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)]
+        return self.default if tile is None else tile
+
+    def tile_row(self, x, y, width):
+        ''' returns the list of the tiles of the width locations from (x, y) rightwards,
+            the default tile for those never written
+        '''
+        row = []
+        end = x + width
+        while x < end:
+            count = min(utils.CHUNK_SIZE - (x & CHUNK_MASK), end - x)
+            tiles = self.grid.chunks.get((x >> utils.CHUNK_SHIFT, y >> utils.CHUNK_SHIFT))
+            if tiles is None:
+                row += [self.default] * count
+            else:
+                start = ((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)
+                segment = tiles[start:start + count]
+                if None in segment:
+                    segment = [self.default if tile is None else tile for tile in segment]
+                row += segment
+            x += count
+        return row
 
     def __setitem__(self, key, value):
-        self.grid[key] = value
+        x, y = key
+        value = _stored(value)
+        self.grid[(y << utils.PACK_SHIFT) + x] = value
+        self._set_bitmaps(x, y, value)
+        self.journal.record_cell(key)
+
+    def locations(self):
+        ''' returns an iterator over every location written to the map '''
+        return map(utils.unpack, self.grid)
+
+    def items(self):
+        ''' returns an iterator over the (location, tile) pairs written to the map '''
+        return ((utils.unpack(key), tile) for key, tile in self.grid.items())
+
+    @staticmethod
+    def bitmap_index(x, y):
+        ''' returns the index of location (x, y) inside the bitmaps of its chunk '''
+        return ((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)
+
+    def is_opaque(self, x, y):
+        ''' returns true if the tile at (x, y) blocks sight '''
+        chunk = self.opacity.get((x >> utils.CHUNK_SHIFT, y >> utils.CHUNK_SHIFT))
+        if chunk is None:
+            return self.default is None or bool(self.default.block_sight)
+        return chunk[((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)] == 1
+
+    def is_walkable(self, x, y):
+        ''' returns true if the tile at (x, y) does not block movement '''
+        chunk = self.walkability.get((x >> utils.CHUNK_SHIFT, y >> utils.CHUNK_SHIFT))
+        if chunk is None:
+            return self.default is not None and not self.default.blocks
+        return chunk[((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)] == 1
+
+    def opacity_window(self, rect):
+        ''' returns a bytearray with the opacity of every location inside rect,
+            row by row starting at the bottom left corner of rect.
+        '''
+        return self._window(rect, self.opacity, self.default is None or bool(self.default.block_sight))
+
+    def walkability_window(self, rect):
+        ''' returns a bytearray with the walkability of every location inside rect, see Map.opacity_window '''
+        return self._window(rect, self.walkability, self.default is not None and not self.default.blocks)
+
+    def _window(self, rect, bitmaps, default):
+        # copies the rows of every chunk overlapping rect into a single dense buffer
+        width = rect.x2 - rect.x1
+        window = bytearray([default]) * (width * (rect.y2 - rect.y1))
+
+        for cy in range(rect.y1 >> utils.CHUNK_SHIFT, ((rect.y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+            bottom = max(rect.y1, cy << utils.CHUNK_SHIFT)
+            top = min(rect.y2, (cy + 1) << utils.CHUNK_SHIFT)
+
+            for cx in range(rect.x1 >> utils.CHUNK_SHIFT, ((rect.x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                chunk = bitmaps.get((cx, cy))
+                if chunk is None:
+                    continue
+                left = max(rect.x1, cx << utils.CHUNK_SHIFT)
+                right = min(rect.x2, (cx + 1) << utils.CHUNK_SHIFT)
+
+                for y in range(bottom, top):
+                    start = ((y & CHUNK_MASK) << utils.CHUNK_SHIFT) + (left & CHUNK_MASK)
+                    offset = (y - rect.y1) * width + left - rect.x1
+                    window[offset:offset + right - left] = chunk[start:start + right - left]
+
+        return window
+
+    def _chunk_bitmaps(self, key):
+        # returns the opacity and walkability bitmaps of a chunk, creating them from the default tile
+        opacity = self.opacity.get(key)
+        if opacity is None:
+            opaque = self.default is None or bool(self.default.block_sight)
+            walkable = self.default is not None and not self.default.blocks
+            opacity = self.opacity[key] = bytearray([opaque]) * CHUNK_AREA
+            self.walkability[key] = bytearray([walkable]) * CHUNK_AREA
+        return opacity, self.walkability[key]
+
+    def _set_bitmaps(self, x, y, tile):
+        # updates the bitmaps of a single location
+        opacity, walkability = self._chunk_bitmaps((x >> utils.CHUNK_SHIFT, y >> utils.CHUNK_SHIFT))
+        i = ((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (x & CHUNK_MASK)
+        opacity[i] = bool(tile.block_sight)
+        walkability[i] = not tile.blocks
+
+    def _fill(self, rect, tile):
+        # writes tile and its bitmap values to every location inside rect, one chunk row at a time
+        opaque = bytes([bool(tile.block_sight)])
+        walkable = bytes([not tile.blocks])
+
+        for cx in range(rect.x1 >> utils.CHUNK_SHIFT, ((rect.x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+            left = max(rect.x1, cx << utils.CHUNK_SHIFT) & CHUNK_MASK
+            right = ((min(rect.x2, (cx + 1) << utils.CHUNK_SHIFT) - 1) & CHUNK_MASK) + 1
+
+            for cy in range(rect.y1 >> utils.CHUNK_SHIFT, ((rect.y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                opacity, walkability = self._chunk_bitmaps((cx, cy))
+                bottom = max(rect.y1, cy << utils.CHUNK_SHIFT) & CHUNK_MASK
+                top = ((min(rect.y2, (cy + 1) << utils.CHUNK_SHIFT) - 1) & CHUNK_MASK) + 1
+
+                tiles = [tile] * (right - left)
+                for row in range(bottom, top):
+                    start = (row << utils.CHUNK_SHIFT) + left
+                    end = (row << utils.CHUNK_SHIFT) + right
+                    self.grid.write((cx, cy), start, tiles)
+                    opacity[start:end] = opaque * (right - left)
+                    walkability[start:end] = walkable * (right - left)
 
     def __str__(self):
-        return "Map object \nDefault: {0} \nGrid: {1}".format(self.default, self.grid)
+        return "Map object \nDefault: {0} \nGrid: {1}".format(self.default, dict(self.items()))
 
     def in_area(self, width, height, location1, location2):
         ''' returns true if location1 and location2 are within the same offset of width and height '''
@@ -76,15 +351,19 @@ class Map:
 
         return x1 == x2 and y1 == y2
 
+    @staticmethod
+    def area_corner(width, height, location):
+        ''' Returns the bottom left corner of the area of given size that location is in, see get_area '''
+        if (width == 0 or height == 0):
+            raise ValueError('Width and height must not be 0')
+
+        return (math.floor(location[0]/width) * width, math.floor(location[1]/height) * height)
+
     def get_area(self, width, height, location):
         ''' Returns the area of given size that location is in
             Treating point (0, 0) as the bottom left corner of an area.
         '''
-        if (width == 0 or height == 0):
-            raise ValueError('Width and height must not be 0')
-
-        x_offset = math.floor(location[0]/width) * width
-        y_offset = math.floor(location[1]/height) * height
+        x_offset, y_offset = self.area_corner(width, height, location)
 
         area = []
         for x in range(width):
@@ -98,57 +377,119 @@ class Map:
 
     def set_rect(self, rect, tile, is_room=False):
         ''' sets a rectangular area of dimensions w*h, with the buttom left corner at
-            corner_x, corner_y, as shallow copies of given tile. '''
-        for x in range(rect.x1, rect.x2):
-            for y in range(rect.y1, rect.y2):
-                try:
-                    self[x, y] = tile.shallow_copy()
-                except AttributeError:
-                    print('WARNING: {} missing shallow_copy method'.format(tile))
-                    self[x, y] = tile
+            corner_x, corner_y, to given tile, every location sharing one read only copy of it. '''
+        if rect.x1 < rect.x2 and rect.y1 < rect.y2:
+            self._fill(rect, _stored(tile))
+            self.journal.record(rect)
 
         if is_room:
             self.rooms.append(rect)
 
+    def set_tiles(self, rect, cells, palette):
+        ''' bulk writes a block of tiles into rect. cells holds one palette index
+            per location, row by row starting at the bottom left corner of rect.
+            Indices pointing at a None palette entry leave the location untouched.
+            The block is written a chunk at a time, with a slice assignment per chunk row
+            into the tiles and bitmaps of the chunk.
+        '''
+        width = rect.x2 - rect.x1
+        cells = bytes(cells)
+        palette = [tile if tile is None else _stored(tile) for tile in palette]
+
+        # the tile of every palette index, and translation tables from palette indices to 1 for
+        # every written location and to the bitmap values, those of the default tile where untouched
+        tiles = palette + [None] * (256 - len(palette))
+        default_opaque = self.default is None or bool(self.default.block_sight)
+        default_walkable = self.default is not None and not self.default.blocks
+        written = bytes(tile is not None for tile in tiles)
+        opaque = bytes(default_opaque if tile is None else bool(tile.block_sight) for tile in tiles)
+        walkable = bytes(default_walkable if tile is None else not tile.blocks for tile in tiles)
+
+        for cy in range(rect.y1 >> utils.CHUNK_SHIFT, ((rect.y2 - 1) >> utils.CHUNK_SHIFT) + 1):
+            bottom = max(rect.y1, cy << utils.CHUNK_SHIFT)
+            top = min(rect.y2, (cy + 1) << utils.CHUNK_SHIFT)
+
+            for cx in range(rect.x1 >> utils.CHUNK_SHIFT, ((rect.x2 - 1) >> utils.CHUNK_SHIFT) + 1):
+                left = max(rect.x1, cx << utils.CHUNK_SHIFT)
+                right = min(rect.x2, (cx + 1) << utils.CHUNK_SHIFT)
+
+                # untouched locations of a new chunk keep the None tile and default bitmap values
+                key = (cx, cy)
+                new = key not in self.grid.chunks
+                chunk = self.grid.chunk(key)
+                opacity, walkability = self._chunk_bitmaps(key)
+
+                for y in range(bottom, top):
+                    offset = (y - rect.y1) * width + left - rect.x1
+                    segment = cells[offset:offset + right - left]
+                    start = ((y & CHUNK_MASK) << utils.CHUNK_SHIFT) | (left & CHUNK_MASK)
+                    end = start + right - left
+
+                    row_tiles = list(map(tiles.__getitem__, segment))
+                    row_opaque = segment.translate(opaque)
+                    row_walkable = segment.translate(walkable)
+                    if not new and None in row_tiles:
+                        # keep what the untouched locations of the chunk already hold
+                        mask = segment.translate(written)
+                        row_tiles = [tile if tile is not None else old for tile, old in zip(row_tiles, chunk[start:end])]
+                        row_opaque = bytes(value if keep else old for value, keep, old in zip(row_opaque, mask, opacity[start:end]))
+                        row_walkable = bytes(value if keep else old
+                                             for value, keep, old in zip(row_walkable, mask, walkability[start:end]))
+
+                    self.grid.write(key, start, row_tiles)
+                    opacity[start:end] = row_opaque
+                    walkability[start:end] = row_walkable
+
+        # the runs of written locations, recorded as a single edit, are only needed by subscribers of the journal
+        if not self.journal.subscribers:
+            if rect.x1 < rect.x2 and rect.y1 < rect.y2:
+                self.journal.record(rect)
+            return
+
+        runs = []
+        for row, y in enumerate(range(rect.y1, rect.y2)):
+            mask = cells[row * width:(row + 1) * width].translate(written)
+            run_start = mask.find(1)
+            while run_start != -1:
+                run_end = mask.find(0, run_start)
+                if run_end == -1:
+                    run_end = width
+                runs.append((rect.x1 + run_start, y, rect.x1 + run_end, y + 1))
+                run_start = mask.find(1, run_end)
+
+        if runs:
+            self.journal.record_rects(runs)
+
     def set_connection(self, location1, location2, width, tile):
         ''' creates a connection from location 1 to location 2 at given width
             by creating a rectangle horizontally and then vertically
         '''
-
-        # get the rightmost x location
-        start_x = min(location1[0], location2[0]) - width // 2
-        # get the bottom y location
-        start_y = min(location1[1], location2[1])
-
-        # create a rect from right x location to left x location with given width.
-        # half the width is added to each side of the rect to compensate for the offset of the vertical rect
-        rect_h = utils.Rect(start_x, location1[1] - width // 2, abs(location1[0]-location2[0]) + width, width)
-
-        # create a rect from bottom y location to top y with given width.
-        rect_v = utils.Rect(location2[0] - width // 2, start_y, width, abs(location1[1]-location2[1]))
+        rect_h, rect_v = connection_rects(location1, location2, width)
 
         # draw the rects
         self.set_rect(rect_h, tile)
         self.set_rect(rect_v, tile)
 
-    @classmethod
-    def Random(cls, area_rect, room_number, min_room_size, max_room_size, center, default, room_tile, timeout=1000):
-        ''' generate a random map inside area_rect, WARNING: Will enter an infinite loop if not given enough space in area_rect. '''
-
-        map = cls(default=default)
-
+    def place_random_rooms(self, area_rect, room_number, min_room_size, max_room_size, center, room_tile, timeout=1000,
+                           tracker=None):
+        ''' places rooms at random positions in area_rect, starting with one around center,
+            every room connected to the previous one, see Map.Random.
+            tracker, a connectivity.Connectivity of the map, is updated as every room and connection is placed.
+        '''
         room_timeout = timeout
 
         # Generate center room around the player
         w = max_room_size
         h = max_room_size
         center_room = utils.Rect(center[0] - w // 2, center[1] - h // 2, w, h)
-        map.set_rect(center_room, room_tile, True)
+        self.set_rect(center_room, room_tile, True)
+        if tracker is not None:
+            tracker.update()
 
         last_center = center
 
         # until we get to the required number of rooms
-        while len(map.rooms) < room_number:
+        while len(self.rooms) < room_number:
 
             # generate a random rect
             w = random.randrange(min_room_size, max_room_size + 1)
@@ -166,7 +507,7 @@ class Map:
                 intersects = True
 
             else:
-                for other_room in map.rooms:
+                for other_room in self.rooms:
                     if room.intersects(other_room):
                         intersects = True
 
@@ -178,19 +519,323 @@ class Map:
                 continue
 
             # add the room to the map
-            map.set_rect(room, room_tile, True)
+            self.set_rect(room, room_tile, True)
 
             # add a path from the center of the previous room to the center of the room
             center = (x + w // 2, y + h // 2)
             tunnel_w = random.randrange(2, 3 + w // 4)
-            map.set_connection(last_center, center, tunnel_w, room_tile)
+            self.set_connection(last_center, center, tunnel_w, room_tile)
+            if tracker is not None:
+                tracker.update()
             # remember the center of the new room
             last_center = center
             # reset room timeout
             room_timeout = timeout
 
+    def place_bsp_rooms(self, area_rect, room_number, min_room_size, max_room_size, center, room_tile, tracker=None):
+        ''' places up to room_number rooms in area_rect, one in every leaf of a bsp partition of it.
+            Leaves keep a wall on their right and top sides, so rooms never overlap nor touch,
+            and the rooms of the two sons of every node are connected through their closest pair.
+            The room of the leaf holding center is placed around it when the leaf allows.
+            tracker is updated as rooms and connections are placed, see Map.place_random_rooms.
+        '''
+        root = bsp.bsp_new_with_size(area_rect.x1, area_rect.y1, area_rect.x2 - area_rect.x1, area_rect.y2 - area_rect.y1)
+        root.split_leaves(None, room_number, min_room_size + 1, min_room_size + 1, BSP_RATIO, BSP_RATIO)
+
+        rooms = {}
+        for leaf in root.leaves():
+            room = bsp_room(leaf, min_room_size, max_room_size, center)
+            if room is not None:
+                self.set_rect(room, room_tile, True)
+                rooms[leaf] = [room]
+                if tracker is not None:
+                    tracker.update()
+
+        center_leaf = root.find_node(*center)
+        if center_leaf in rooms and not rooms[center_leaf][0].contains(utils.Rect(center[0], center[1], 1, 1)):
+            self.set_connection(center, rooms[center_leaf][0].get_center(), 2, room_tile)
+            if tracker is not None:
+                tracker.update()
+
+        # sons are connected before their father, the rooms of a node being those of its leaves
+        for node in root.post_order():
+            if node.is_leaf():
+                continue
+            left, right = rooms.pop(node.left, []), rooms.pop(node.right, [])
+            if left and right:
+                location1, location2 = min(((a.get_center(), b.get_center()) for a in left for b in right),
+                                           key=lambda pair: abs(pair[0][0] - pair[1][0]) + abs(pair[0][1] - pair[1][1]))
+                tunnel_w = random.randrange(2, 3 + min_room_size // 4)
+                self.set_connection(location1, location2, tunnel_w, room_tile)
+                if tracker is not None:
+                    tracker.update()
+            rooms[node] = left + right
+
+    @classmethod
+    def Random(cls, area_rect, room_number, min_room_size, max_room_size, center, default, room_tile, timeout=1000,
+               layout='random'):
+        ''' generate a random map inside area_rect, WARNING: Will enter an infinite loop if not given enough space in area_rect.
+            Once the rooms are placed, any walkable area that can't be reached from center is connected to it.
+            layout is 'random' to place rooms at random positions, retrying those overlapping others,
+            or 'bsp' to place a room in every leaf of a bsp.Bsp partition of area_rect, see Map.place_bsp_rooms.
+        '''
+
+        map = cls(default=default)
+        tracker = connectivity.Connectivity(map, center)
+
+        if layout == 'bsp':
+            map.place_bsp_rooms(area_rect, room_number, min_room_size, max_room_size, center, room_tile, tracker)
+        elif layout == 'random':
+            map.place_random_rooms(area_rect, room_number, min_room_size, max_room_size, center, room_tile, timeout,
+                                   tracker)
+        else:
+            raise ValueError('Map.Random: unknown layout {!r}'.format(layout))
+
+        # connect any pockets left unreachable by clipped corridors
+        for location1, location2 in tracker.suggest_connections():
+            map.set_connection(location1, location2, 2, room_tile)
+
+        return map
+
+    @classmethod
+    def Cave(cls, area_rect, default, floor_tile, fill=0.45, iterations=4, seed=None):
+        ''' generate a cellular automaton cave filling area_rect, see caves.generate.
+            Requires NumPy.
+        '''
+        from . import caves
+
+        map = cls(default=default)
+        cells = caves.generate(area_rect.x2 - area_rect.x1, area_rect.y2 - area_rect.y1, fill, iterations, seed=seed)
+        map.set_tiles(area_rect, cells, (None, floor_tile))
+
+        return map
+
+    @classmethod
+    def Terrain(cls, area_rect, heightmap, levels, tiles, default=None):
+        ''' generate an outdoor map filling area_rect from a heightmap.HeightMap of its size.
+            A location gets tiles[i] for heights up to levels[i], the ascending levels
+            splitting the heights into len(tiles) bands. Heights above the band of the
+            last tile get the last tile, so every location is written. Requires NumPy.
+        '''
+        if not tiles:
+            raise ValueError('Map.Terrain: no tiles given')
+
+        map = cls(default=default)
+        map.set_tiles(area_rect, heightmap.bands(levels).clip(max=len(tiles) - 1), tiles)
+
+        return map
+
+    @classmethod
+    def Partitioned(cls, area_rect, regions, room_number, min_room_size, max_room_size, center, default, room_tile,
+                    timeout=1000, processes=None, seed=None):
+        ''' generate a random map inside area_rect on multiple cores.
+            area_rect is split into a grid of regions (columns, rows), each region is filled with
+            rooms and corridors by a worker process and the regions are then stitched together
+            by connecting the closest rooms of every pair of neighbouring regions, among the
+            BORDER_ROOMS rooms of each region closest to their shared border.
+            The borders of the regions are rounded to chunk borders, so the workers build
+            whole chunks of the map that are merged as they are.
+        '''
+        columns, rows = regions
+
+        # region borders fall on chunk borders, so every chunk of the map is generated by a single region
+        xs = _region_bounds(area_rect.x1, area_rect.x2, columns)
+        ys = _region_bounds(area_rect.y1, area_rect.y2, rows)
+        if any(start >= end for bounds in (xs, ys) for start, end in zip(bounds, bounds[1:])):
+            raise ValueError('Map.Partitioned: {} regions leave some narrower than a chunk'.format(regions))
+
+        rng = random.Random(seed)
+        jobs = []
+        for row in range(rows):
+            for column in range(columns):
+                x1, x2 = xs[column], xs[column + 1]
+                y1, y2 = ys[row], ys[row + 1]
+
+                # spread the rooms as evenly as possible between the regions
+                index = len(jobs)
+                rooms = room_number // (columns * rows) + (index < room_number % (columns * rows))
+
+                region_center = None
+                if x1 <= center[0] < x2 and y1 <= center[1] < y2:
+                    region_center = tuple(center)
+
+                jobs.append(((x1, y1, x2, y2), rooms, min_room_size, max_room_size,
+                             region_center, timeout, rng.getrandbits(64), default, room_tile))
+
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_generate_region, jobs)
+
+        map = cls(default=default)
+        borders = []
+        for (x1, y1, x2, y2), grid, opacity, walkability, rooms, sides in results:
+            # the regions hold distinct chunks, so their tiles and bitmaps are merged whole
+            map.grid.merge(grid)
+            map.opacity.update(opacity)
+            map.walkability.update(walkability)
+            map.journal.record(utils.Rect(x1, y1, x2 - x1, y2 - y1))
+
+            map.rooms.extend(utils.Rect(*room) for room in rooms)
+            borders.append(sides)
+
+        # stitch every region to its right and upper neighbours, through the closest pair of their border rooms
+        for row in range(rows):
+            for column in range(columns):
+                index = row * columns + column
+                neighbours = []
+                if column < columns - 1:
+                    neighbours.append((index + 1, 'right', 'left'))
+                if row < rows - 1:
+                    neighbours.append((index + columns, 'top', 'bottom'))
+
+                for other, side, other_side in neighbours:
+                    if not borders[index][side] or not borders[other][other_side]:
+                        continue
+                    location1, location2 = min(((a, b) for a in borders[index][side] for b in borders[other][other_side]),
+                                               key=lambda pair: abs(pair[0][0] - pair[1][0]) + abs(pair[0][1] - pair[1][1]))
+                    tunnel_w = rng.randrange(2, 3 + min_room_size // 4)
+                    map.set_connection(location1, location2, tunnel_w, room_tile)
+
         return map
 
+
+def _stored(tile):
+    ''' returns the read only copy of tile a map stores, see Map. Tiles without a shared method are stored as they are. '''
+    try:
+        return tile.shared()
+    except AttributeError:
+        print('WARNING: {} missing shared method'.format(tile))
+        return tile
+
+
+def connection_rects(location1, location2, width):
+    ''' returns the horizontal and vertical rects connecting location1 to location2 at given width '''
+
+    # get the rightmost x location
+    start_x = min(location1[0], location2[0]) - width // 2
+    # get the bottom y location
+    start_y = min(location1[1], location2[1])
+
+    # create a rect from right x location to left x location with given width.
+    # half the width is added to each side of the rect to compensate for the offset of the vertical rect
+    rect_h = utils.Rect(start_x, location1[1] - width // 2, abs(location1[0]-location2[0]) + width, width)
+
+    # create a rect from bottom y location to top y with given width.
+    rect_v = utils.Rect(location2[0] - width // 2, start_y, width, abs(location1[1]-location2[1]))
+
+    return rect_h, rect_v
+
+
+def bsp_room(leaf, min_room_size, max_room_size, center=None):
+    ''' returns a random room inside a bsp.Bsp leaf, leaving a wall on its right and top sides,
+        placed around center when it lies in there. None if the leaf is too small for a room.
+    '''
+    if min(leaf.w, leaf.h) - 1 < min_room_size:
+        return None
+
+    def position(start, space, size, target):
+        # a random start for size locations among space, covering target if it is in there
+        low, high = start, start + space - size
+        if target is not None and start <= target < start + space:
+            low, high = max(low, target - size + 1), min(high, target)
+        return random.randrange(low, high + 1)
+
+    inside = center is not None and leaf.contains(*center)
+    w = random.randrange(min_room_size, min(max_room_size, leaf.w - 1) + 1)
+    h = random.randrange(min_room_size, min(max_room_size, leaf.h - 1) + 1)
+    x = position(leaf.x, leaf.w - 1, w, center[0] if inside else None)
+    y = position(leaf.y, leaf.h - 1, h, center[1] if inside else None)
+    return utils.Rect(x, y, w, h)
+
+
+def _region_bounds(start, end, count):
+    ''' returns the count + 1 borders splitting start to end into count regions of about
+        the same size, the inner borders rounded to the nearest chunk border
+    '''
+    inner = [((start + (end - start) * i // count + utils.CHUNK_SIZE // 2) >> utils.CHUNK_SHIFT) << utils.CHUNK_SHIFT
+             for i in range(1, count)]
+    return [start] + inner + [end]
+
+
+def _generate_region(job):
+    ''' Worker for Map.Partitioned, generates the rooms and corridors of a single region.
+        Returns the region, the TileGrid and the opacity and walkability bitmaps of its chunks,
+        the list of rooms as (x, y, w, h) tuples clipped to the region, and for each of its
+        sides the centers of the BORDER_ROOMS rooms closest to it.
+    '''
+    region, room_number, min_room_size, max_room_size, center, timeout, seed, default, room_tile = job
+    rng = random.Random(seed)
+
+    x1, y1, x2, y2 = region
+    area_rect = utils.Rect(x1, y1, x2 - x1, y2 - y1)
+    room_tile = _stored(room_tile)
+    rooms = []
+
+    # holds the tiles and bitmaps of the chunks of the region
+    region_map = Map(default=default)
+
+    def clip(rect):
+        # the part of rect inside the region
+        left, bottom = max(rect.x1, x1), max(rect.y1, y1)
+        return utils.Rect(left, bottom, max(min(rect.x2, x2) - left, 0), max(min(rect.y2, y2) - bottom, 0))
+
+    def carve(rect):
+        # clip the rect to the region and fill it a chunk row at a time
+        rect = clip(rect)
+        if rect.x1 == rect.x2 or rect.y1 == rect.y2:
+            return
+        region_map._fill(rect, room_tile)
+
+    last_center = None
+    if center is not None:
+        # Generate center room around the player
+        w = h = max_room_size
+        center_room = clip(utils.Rect(center[0] - w // 2, center[1] - h // 2, w, h))
+        carve(center_room)
+        rooms.append(center_room)
+        last_center = center
+
+    room_timeout = timeout
+    while len(rooms) < room_number:
+
+        # generate a random rect
+        w = rng.randrange(min_room_size, max_room_size + 1)
+        h = rng.randrange(min_room_size, max_room_size + 1)
+
+        x = rng.randrange(x1, x2)
+        y = rng.randrange(y1, y2)
+
+        room = utils.Rect(x, y, w, h)
+
+        if not area_rect.contains(room) or any(room.intersects(other) for other in rooms):
+            room_timeout -= 1
+            if not room_timeout:
+                break
+            continue
+
+        carve(room)
+        rooms.append(room)
+
+        # add a path from the center of the previous room to the center of the room
+        room_center = (x + w // 2, y + h // 2)
+        if last_center is not None:
+            tunnel_w = rng.randrange(2, 3 + w // 4)
+            for rect in connection_rects(last_center, room_center, tunnel_w):
+                carve(rect)
+        last_center = room_center
+        room_timeout = timeout
+
+    # Map.Partitioned only stitches the regions through the rooms closest to their borders
+    centers = [((room.x1 + room.x2) // 2, (room.y1 + room.y2) // 2) for room in rooms]
+    sides = {
+        'left': heapq.nsmallest(BORDER_ROOMS, centers, key=lambda center: center[0] - x1),
+        'right': heapq.nsmallest(BORDER_ROOMS, centers, key=lambda center: x2 - center[0]),
+        'bottom': heapq.nsmallest(BORDER_ROOMS, centers, key=lambda center: center[1] - y1),
+        'top': heapq.nsmallest(BORDER_ROOMS, centers, key=lambda center: y2 - center[1]),
+    }
+
+    return (region, region_map.grid, region_map.opacity, region_map.walkability,
+            [(room.x1, room.y1, room.x2 - room.x1, room.y2 - room.y1) for room in rooms], sides)
+
 if __name__ == '__main__':
 
     import utils
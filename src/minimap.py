@@ -0,0 +1,174 @@
+''' An overview of the explored world, drawn with half block glyphs.
+    The colors of the explored tiles are kept per chunk along with mip levels
+    downsampled by 2, 4 and 8, which are updated chunk by chunk as cells are
+    explored or tiles change. Rendering reads a fixed number of pixels from the
+    level matching the zoom, so it costs the same whatever the size of the world.
+'''
+
+import math
+
+import numpy
+
+try:
+    from . import utils
+    from . import color
+except ImportError:
+    import utils
+    import color
+
+# the glyph whose upper half is drawn with the foreground, libtcodpy.CHAR_SUBP_N
+HALF_BLOCK = 228
+BLANK = ord(' ')
+
+
+class Minimap:
+
+    ''' The explored part of a map as seen by player, at 1 + levels zoom levels.
+        Level i has a pixel per 2**i * 2**i locations, colored with the average
+        color of the explored locations under it.
+    '''
+
+    def __init__(self, game_map, player, levels=3):
+        self.map = game_map
+        self.player = player
+        self.levels = levels
+        self.subscription = self.map.journal.subscribe()
+
+        # chunk key -> [(colors, explored) of every level], arrays indexed [y, x] from the bottom left
+        self.chunks = {}
+        # incremented whenever the minimap changes
+        self.version = 0
+
+        if self.player.explored_log is None:
+            self.player.explored_log = []
+        self._explore(self.player.explored.keys)
+        self._downsample(self.chunks)
+
+    def update(self):
+        ''' pulls the newly explored locations and the edits of the map, returns true if anything changed '''
+        dirty = set()
+
+        # sweep the steps the player passed through into the log
+        self.player.sweep_explored()
+        for keys in self.player.explored_log:
+            dirty |= self._explore(keys)
+        self.player.explored_log.clear()
+
+        changes = self.subscription.pull()
+        if changes is None:
+            changes = {key: utils.Rect(key[0] << utils.CHUNK_SHIFT, key[1] << utils.CHUNK_SHIFT,
+                                       utils.CHUNK_SIZE, utils.CHUNK_SIZE) for key in self.chunks}
+        for key, rect in changes.items():
+            if key in self.chunks and self._recolor(key, rect):
+                dirty.add(key)
+
+        self._downsample(dirty)
+        if dirty:
+            self.version += 1
+        return bool(dirty)
+
+    def _tile_color(self, x, y):
+        return color.rgb(self.map[x, y].color)
+
+    def _chunk(self, key):
+        levels = self.chunks.get(key)
+        if levels is None:
+            levels = self.chunks[key] = []
+            for level in range(self.levels + 1):
+                size = utils.CHUNK_SIZE >> level
+                levels.append((numpy.zeros((size, size, 3), numpy.uint8), numpy.zeros((size, size), bool)))
+        return levels
+
+    def _explore(self, keys):
+        # writes the color of newly explored locations into level 0, returns the chunks touched
+        keys = numpy.fromiter(keys, numpy.int64, len(keys))
+        xs = ((keys + utils.PACK_OFFSET) & utils.PACK_MASK) - utils.PACK_OFFSET
+        ys = (keys - xs) >> utils.PACK_SHIFT
+
+        colors = numpy.array([self._tile_color(x, y) for x, y in zip(xs.tolist(), ys.tolist())],
+                             numpy.uint8).reshape(-1, 3)
+
+        chunks = (xs >> utils.CHUNK_SHIFT) * (1 << 32) + (ys >> utils.CHUNK_SHIFT)
+        touched = set()
+        for chunk in numpy.unique(chunks).tolist():
+            mask = chunks == chunk
+            cx, cy = int(xs[mask][0]) >> utils.CHUNK_SHIFT, int(ys[mask][0]) >> utils.CHUNK_SHIFT
+            pixels, explored = self._chunk((cx, cy))[0]
+            cells = (ys[mask] & (utils.CHUNK_SIZE - 1), xs[mask] & (utils.CHUNK_SIZE - 1))
+            pixels[cells] = colors[mask]
+            explored[cells] = True
+            touched.add((cx, cy))
+        return touched
+
+    def _recolor(self, key, rect):
+        # reads the tiles of the explored locations of a chunk inside rect again, returns true if any
+        pixels, explored = self.chunks[key][0]
+        left, bottom = key[0] << utils.CHUNK_SHIFT, key[1] << utils.CHUNK_SHIFT
+        found = False
+        for y, x in zip(*numpy.nonzero(explored)):
+            if rect.x1 <= left + x < rect.x2 and rect.y1 <= bottom + y < rect.y2:
+                pixels[y, x] = self._tile_color(left + int(x), bottom + int(y))
+                found = True
+        return found
+
+    def _downsample(self, keys):
+        # recomputes the mip levels of chunks from their level 0
+        for key in keys:
+            levels = self.chunks[key]
+            pixels, explored = levels[0]
+            for level in range(1, self.levels + 1):
+                size, factor = utils.CHUNK_SIZE >> level, 1 << level
+                counts = explored.reshape(size, factor, size, factor).sum(axis=(1, 3))
+                sums = (pixels * explored[..., None]).reshape(size, factor, size, factor, 3).sum(axis=(1, 3))
+                levels[level] = ((sums // numpy.maximum(counts, 1)[..., None]).astype(numpy.uint8), counts > 0)
+
+    def image(self, left, bottom, width, height, level):
+        ''' returns the (colors, explored) pixels of a level from pixel (left, bottom),
+            arrays of height rows and width columns indexed [y, x] from the bottom left
+        '''
+        colors = numpy.zeros((height, width, 3), numpy.uint8)
+        explored = numpy.zeros((height, width), bool)
+
+        size = utils.CHUNK_SIZE >> level
+        for cx in range(left // size, (left + width - 1) // size + 1):
+            for cy in range(bottom // size, (bottom + height - 1) // size + 1):
+                levels = self.chunks.get((cx, cy))
+                if levels is None:
+                    continue
+
+                # the part of the chunk inside the image, in image and in chunk pixels
+                x1, x2 = max(left, cx * size), min(left + width, (cx + 1) * size)
+                y1, y2 = max(bottom, cy * size), min(bottom + height, (cy + 1) * size)
+                target = (slice(y1 - bottom, y2 - bottom), slice(x1 - left, x2 - left))
+                source = (slice(y1 - cy * size, y2 - cy * size), slice(x1 - cx * size, x2 - cx * size))
+
+                pixels, known = levels[level]
+                colors[target] = pixels[source]
+                explored[target] = known[source]
+        return colors, explored
+
+    def render(self, center, width, height, level, marker=(255, 255, 255)):
+        ''' returns the (back, fore, char) arrays of a width * height cells view around center,
+            indexed [screen y, screen x]. A cell shows 2 * 2 pixels of level, its upper pair
+            as the foreground of a HALF_BLOCK and its lower pair as the background.
+            The pixel under center is drawn with marker unless marker is None.
+        '''
+        scale = 1 << level
+        left = math.floor(center[0] / scale) - width
+        bottom = math.floor(center[1] / scale) - height
+        colors, explored = self.image(left, bottom, 2 * width, 2 * height, level)
+
+        # average the pixels of each cell in horizontal pairs
+        counts = explored.reshape(2 * height, width, 2).sum(axis=2)
+        sums = (colors * explored[..., None]).reshape(2 * height, width, 2, 3).sum(axis=2)
+        pairs = (sums // numpy.maximum(counts, 1)[..., None]).astype(numpy.uint8)
+
+        if marker is not None:
+            pairs[height, width // 2] = marker
+            counts[height, width // 2] = 1
+
+        # screen rows go down, pixel rows go up
+        pairs, counts = pairs[::-1], counts[::-1]
+        fore, back = pairs[0::2], pairs[1::2]
+        char = numpy.where((counts[0::2] > 0), HALF_BLOCK, BLANK).astype(numpy.int32)
+        return back, fore, char
@@ -1,9 +1,16 @@
-from collections import defaultdict
+import math
+from collections import defaultdict, namedtuple
+from types import SimpleNamespace
 
 try:
     from . import raycast as rc
+    from . import utils
 except:
     import raycast as rc
+    import utils
+
+# the cells that entered and left the field of view between two FOV updates, as utils.LocationSets
+FovDelta = namedtuple('FovDelta', ['entered', 'left'])
 
 class Object:
     def __init__(self, location, symbol, color, visible, blocks=True):
@@ -27,6 +34,19 @@ class Creature(Object):
 
         self.immortal = kwargs.get("immortal", False)
 
+        # vision cone, facing is an angle as used by raycast.cast_rays
+        self.facing = kwargs.get("facing", 0)
+        self.fov_angle = kwargs.get("fov_angle", rc.CIRCLE)
+
+    def move(self, velocity):
+        super().move(velocity)
+        self.face(velocity)
+
+    def face(self, direction):
+        # turns the creature towards given direction vector
+        if direction[0] or direction[1]:
+            self.facing = math.atan2(direction[0], direction[1])
+
     def is_dead(self):
         return not self.immortal and life <= 0
 
@@ -34,30 +54,92 @@ class Player(Creature):
 
     '''
         The playable player object
+        The field of view is computed lazily, seen is recomputed on its first access
+        after a move and explored sweeps every position passed through since.
+        fov_delta holds the FovDelta of the last FOV update.
     '''
     def __init__(self, location, symbol, color, game_map, life, **kwargs):
-        super().__init__(location, symbol, color, life)
+        super().__init__(location, symbol, color, life, **kwargs)
         
-        self.explored = set()
+        self._explored = utils.LocationSet()
         self.map = game_map
 
         self.fov = kwargs.get("fov", 100)
 
+        # optional speculative.SpeculativeFov precomputing the FOV of the next step
+        self.speculative = kwargs.get("speculative", None)
+
+        # the (location, facing) of every step whose FOV is still missing from explored
+        self._pending = []
+        # sets of packed keys newly explored since its reader last cleared it,
+        # only kept once a reader such as minimap.Minimap sets it to a list
+        self.explored_log = None
+        self._seen = utils.LocationSet()
         self.update_fov()
 
 
     def move(self, velocity):
         super().move(velocity)
         
-        self.update_fov()
+        self._pending.append(self._viewpoint())
+        self._dirty = True
+
+    def _viewpoint(self):
+        # the facing only matters for vision cones
+        return (self.location, self.facing if self.fov_angle < rc.CIRCLE else 0)
+
+    @property
+    def seen(self):
+        if self._dirty:
+            self.update_fov()
+        return self._seen
+
+    @property
+    def explored(self):
+        self.sweep_explored()
+        return self._explored
+
+    def sweep_explored(self):
+        ''' adds what was seen from every step since the last FOV update to explored,
+            and to explored_log when it is kept
+        '''
+        if self._dirty:
+            self.update_fov()
+
+        if self._pending:
+            # the positions passed through between two FOV updates, each visited position only once
+            for location, facing in set(self._pending):
+                viewpoint = SimpleNamespace(location=location, facing=facing, fov_angle=self.fov_angle)
+                self._explore({utils.pack(location)})
+                self._explore(set(rc.cast_rays(viewpoint, self.map, self.fov, packed=True)))
+            self._pending.clear()
+
+    def _explore(self, keys):
+        # adds a set of packed keys to explored
+        if self.explored_log is not None:
+            keys = keys - self._explored.keys
+            if keys:
+                self.explored_log.append(keys)
+        self._explored.keys |= keys
 
     def update_fov(self):
 
-        self.explored.add(self.location)
-        visible = rc.cast_rays(self, self.map, self.fov)
+        self._explore({utils.pack(self.location)})
+
+        visible = None
+        if self.speculative:
+            visible = self.speculative.take(self)
+        if visible is None:
+            visible = rc.cast_rays(self, self.map, self.fov, packed=True)
 
-        self.seen = set(visible)
-        self.explored = self.explored.union(set(visible))
+        seen = utils.LocationSet(keys=set(visible))
+        self.fov_delta = FovDelta(seen - self._seen, self._seen - seen)
+        self._seen = seen
 
+        # everything seen before is explored already
+        self._explore(self.fov_delta.entered.keys)
+        self._dirty = False
 
-    
+        # the current position is explored now
+        if self._pending and self._pending[-1] == self._viewpoint():
+            self._pending.pop()
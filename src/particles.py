@@ -0,0 +1,162 @@
+''' Particles for short lived visual effects such as sparks, embers and projectiles.
+    Particles are not Objects, they live in a fixed pool of NumPy arrays, are advanced
+    together once per tick and handed to the renderer in bulk, so thousands of them
+    cost less than a millisecond per frame. Live particles are kept packed at the
+    front of the arrays, dead ones are compacted away on every update.
+'''
+
+import math
+
+import numpy
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+DEFAULT_SYMBOL = ord('*')
+
+
+class Particles:
+
+    ''' A pool of up to capacity particles.
+        Particles die when their life runs out and, if game_map is given, when they
+        move into a tile that blocks sight. With fade set their color darkens with age.
+    '''
+
+    def __init__(self, capacity=4096, game_map=None, fade=True, seed=None):
+        self.capacity = capacity
+        self.map = game_map
+        self.fade = fade
+        self.random = numpy.random.default_rng(seed)
+
+        self.position = numpy.zeros((capacity, 2), numpy.float32)
+        self.velocity = numpy.zeros((capacity, 2), numpy.float32)
+        # remaining and initial life, in the time unit of update
+        self.life = numpy.zeros(capacity, numpy.float32)
+        self.lifetime = numpy.ones(capacity, numpy.float32)
+        self.color = numpy.zeros((capacity, 3), numpy.uint8)
+        self.symbol = numpy.zeros(capacity, numpy.int32)
+
+        # the particles in [0, count) are alive
+        self.count = 0
+        # incremented whenever the particles change, so renderers know when to draw them again
+        self.version = 0
+
+    def __len__(self):
+        return self.count
+
+    def emit(self, positions, velocities, life, color, symbol=DEFAULT_SYMBOL):
+        ''' adds particles, positions and velocities are (n, 2) sequences, life, color
+            and symbol are either shared by all of them or given per particle.
+            Particles that don't fit in the pool are dropped, returns the number added.
+        '''
+        positions = numpy.asarray(positions, numpy.float32).reshape(-1, 2)
+        n = min(len(positions), self.capacity - self.count)
+        if n <= 0:
+            return 0
+
+        new = slice(self.count, self.count + n)
+        self.position[new] = positions[:n]
+        self.velocity[new] = numpy.broadcast_to(numpy.asarray(velocities, numpy.float32), positions.shape)[:n]
+        self.life[new] = numpy.broadcast_to(numpy.asarray(life, numpy.float32), len(positions))[:n]
+        self.lifetime[new] = self.life[new]
+        self.color[new] = numpy.broadcast_to(numpy.asarray(color, numpy.uint8), (len(positions), 3))[:n]
+        self.symbol[new] = numpy.broadcast_to(numpy.asarray(symbol, numpy.int32), len(positions))[:n]
+
+        self.count += n
+        self.version += 1
+        return n
+
+    def burst(self, location, number, speed, life, color, symbol=DEFAULT_SYMBOL,
+              facing=0, spread=2 * math.pi):
+        ''' emits number particles from the center of the cell at location, flying at up to
+            speed in random directions within the cone of spread centered on facing,
+            angles as in raycast, and living up to life. Returns the number added.
+        '''
+        angles = facing + (self.random.random(number) - 0.5) * spread
+        speeds = speed * self.random.random(number)
+
+        velocities = numpy.empty((number, 2), numpy.float32)
+        velocities[:, 0] = numpy.sin(angles) * speeds
+        velocities[:, 1] = numpy.cos(angles) * speeds
+
+        positions = numpy.empty((number, 2), numpy.float32)
+        positions[:] = (location[0] + 0.5, location[1] + 0.5)
+
+        lives = life * (0.5 + 0.5 * self.random.random(number))
+        return self.emit(positions, velocities, lives, color, symbol)
+
+    def update(self, dt=1.0, gravity=(0, 0), drag=0.0):
+        ''' advances every particle by dt, gravity is added to their velocity
+            and drag is the fraction of the velocity lost per time unit.
+        '''
+        n = self.count
+        if not n:
+            return
+
+        velocity = self.velocity[:n]
+        if drag:
+            velocity *= max(0.0, 1.0 - drag * dt)
+        if gravity[0] or gravity[1]:
+            velocity += numpy.asarray(gravity, numpy.float32) * dt
+        self.position[:n] += velocity * dt
+        self.life[:n] -= dt
+        self.version += 1
+
+        alive = self.life[:n] > 0
+        if self.map is not None:
+            alive &= ~self._blocked(self.cells_of(slice(0, n)))
+        self._compact(alive)
+
+    def clear(self):
+        self.count = 0
+        self.version += 1
+
+    def cells_of(self, index):
+        ''' returns the integer (xs, ys) cells of the particles selected by index '''
+        cells = numpy.floor(self.position[index]).astype(numpy.int64)
+        return cells[:, 0], cells[:, 1]
+
+    def cells(self, rect, seen=None):
+        ''' returns (xs, ys, symbols, colors) of the live particles inside rect, in drawing
+            order, so later particles cover earlier ones in the same cell.
+            seen is an optional utils.LocationSet, particles outside of it are skipped.
+        '''
+        n = self.count
+        xs, ys = self.cells_of(slice(0, n))
+        inside = (xs >= rect.x1) & (xs < rect.x2) & (ys >= rect.y1) & (ys < rect.y2)
+
+        if seen is not None:
+            keys = numpy.fromiter(seen.keys, numpy.int64, len(seen))
+            inside &= numpy.isin((ys << utils.PACK_SHIFT) + xs, keys)
+
+        index = numpy.flatnonzero(inside)
+        colors = self.color[index]
+        if self.fade:
+            remaining = self.life[index] / self.lifetime[index]
+            colors = (colors * numpy.clip(remaining, 0, 1)[:, None]).astype(numpy.uint8)
+
+        return xs[index], ys[index], self.symbol[index], colors
+
+    def _blocked(self, cells):
+        # true for every cell that blocks sight, read from a single opacity window around them
+        xs, ys = cells
+        if not len(xs):
+            return numpy.zeros(0, bool)
+
+        left, bottom = int(xs.min()), int(ys.min())
+        rect = utils.Rect(left, bottom, int(xs.max()) - left + 1, int(ys.max()) - bottom + 1)
+        window = numpy.frombuffer(self.map.opacity_window(rect), numpy.uint8).reshape(rect.y2 - rect.y1, rect.x2 - rect.x1)
+        return window[ys - bottom, xs - left].astype(bool)
+
+    def _compact(self, alive):
+        # moves the live particles to the front of the arrays, keeping their order
+        n = self.count
+        count = int(alive.sum())
+        if count == n:
+            return
+
+        for array in (self.position, self.velocity, self.life, self.lifetime, self.color, self.symbol):
+            array[:count] = array[:n][alive]
+        self.count = count
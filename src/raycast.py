@@ -1,21 +1,34 @@
 import math
 from functools import lru_cache
 
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+
 CIRCLE = 2 * math.pi
 
-def cast_rays(player, map, max_distance):
+def cast_rays(player, map, max_distance, packed=False):
         
         ''' "Casts" rays and returns the visited integer cartasian coordinates
-        Rays are calculated at a 360 degree angle, where an angle of 0 is facing down.'''
+        Rays are calculated at a 360 degree angle, where an angle of 0 is facing down.
+        A player with a facing angle and a fov_angle smaller than CIRCLE only casts
+        the rays inside the cone of fov_angle centered on facing.
+        With packed set the coordinates are returned as packed int keys, see utils.pack.'''
 
         step_size = CIRCLE / (max_distance**2 * 3)
         seen = list()
+        # every ray stays within max_distance of the player, so read the opacity around the player once
+        window = opacity_window(map, player.location, max_distance)
         # Calculate starting angle based on player's facing direction and FOV
-        angle = 0
+        fov_angle = min(getattr(player, 'fov_angle', CIRCLE), CIRCLE)
+        angle = getattr(player, 'facing', 0) - fov_angle / 2 if fov_angle < CIRCLE else 0
+        end = angle + fov_angle
 
-        while angle < CIRCLE:
+        while angle < end:
             # Get the distance from the wall at given angle
-            seen += cast_ray(player.location, angle, map, max_distance)
+            seen += cast_ray(player.location, angle, map, max_distance, window, packed)
             # Fix the bobeye effect based on the player's angle and append it.
 
             # Advance the angle one tick.
@@ -23,12 +36,25 @@ def cast_rays(player, map, max_distance):
 
         return seen
 
-def cast_ray(start, angle, map, max_distance):
+def opacity_window(map, start, max_distance):
+        ''' Returns the opacity of the square around start that rays of max_distance can reach,
+            as a tuple of (bitmap, left, bottom, width), see Map.opacity_window '''
+        reach = int(max_distance) + 1
+        rect = utils.Rect(start[0] - reach, start[1] - reach, 2 * reach + 1, 2 * reach + 1)
+        return map.opacity_window(rect), rect.x1, rect.y1, rect.x2 - rect.x1
+
+def cast_ray(start, angle, map, max_distance, window=None, packed=False):
         ''' Cast an individual ray from start position at given angle.
             Return a list of all cells visited (integer coordinates on a cartesian grid).
-            Each object inside util.Map is expected to have a block_sight boolean argument.
+            Opacity is read from the bitmaps of map, see Map.is_opaque, window may hold
+            an opacity_window around start shared between rays.
+            With packed set the coordinates are returned as packed int keys, see utils.pack.
             Empty tiles (equal to None) are blocking'''
 
+        if window is None:
+            window = opacity_window(map, start, max_distance)
+        opacity, left, bottom, width = window
+
         x, y = start
         x += 0.5
         y += 0.5
@@ -39,13 +65,19 @@ def cast_ray(start, angle, map, max_distance):
         y_step = math.cos(angle) * step_size
 
         seen = []
+        floor = math.floor
+        shift = utils.PACK_SHIFT
 
         for _ in range(int(max_distance / step_size)):
 
-            seen.append((math.floor(x), math.floor(y)))
-            tile = map[math.floor(x), math.floor(y)]
-            
-            if tile.block_sight:
+            cell_x = floor(x)
+            cell_y = floor(y)
+            if packed:
+                seen.append((cell_y << shift) + cell_x)
+            else:
+                seen.append((cell_x, cell_y))
+
+            if opacity[(cell_y - bottom) * width + cell_x - left]:
                 return seen
 
             x = x + x_step
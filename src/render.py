@@ -0,0 +1,209 @@
+''' Off-screen compositing of a frame from a stack of layers.
+    Every layer is a screen sized buffer with masks of the cells it paints. A layer
+    is only rasterized again when the inputs it is drawn from change, and the stack
+    is merged into the frame with masked array copies, bottom layer first, only
+    when one of the layers was drawn again.
+'''
+
+import numpy
+
+try:
+    from . import utils
+except ImportError:
+    import utils
+
+BLANK = ord(' ')
+
+
+def _same(inputs1, inputs2):
+    # inputs are compared item by item, by identity first so big values are rarely compared
+    if inputs1 is None or inputs2 is None or len(inputs1) != len(inputs2):
+        return False
+    return all(a is b or a == b for a, b in zip(inputs1, inputs2))
+
+
+class Layer:
+
+    ''' A screen sized buffer painted by draw(layer), arrays are indexed [screen y, screen x].
+        inputs() returns a tuple of whatever the drawing depends on, the layer is drawn
+        again when it returns something else than last time or after invalidate.
+        A layer without inputs is drawn on every frame.
+    '''
+
+    def __init__(self, name, width, height, draw, inputs=None):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.draw = draw
+        self.inputs = inputs
+
+        self.back = numpy.zeros((height, width, 3), numpy.uint8)
+        self.fore = numpy.zeros((height, width, 3), numpy.uint8)
+        self.char = numpy.full((height, width), BLANK, numpy.int32)
+
+        # the cells whose background, and whose character and foreground, the layer paints
+        self.back_mask = numpy.zeros((height, width), bool)
+        self.glyph_mask = numpy.zeros((height, width), bool)
+
+        self.dirty = True
+        self.drawn_from = None
+
+    def invalidate(self):
+        self.dirty = True
+
+    def clear(self):
+        self.back_mask[:] = False
+        self.glyph_mask[:] = False
+
+    def fill(self, background, mask=None):
+        ''' paints the background of the cells in mask, all of them by default '''
+        if mask is None:
+            self.back[:] = background
+            self.back_mask[:] = True
+        else:
+            self.back[mask] = background if numpy.ndim(background) == 1 else background[mask]
+            self.back_mask |= mask
+
+    def put(self, xs, ys, chars, colors):
+        ''' paints characters of the given colors at the screen cells (xs, ys), all of them arrays.
+            Later cells cover earlier ones.
+        '''
+        self.char[ys, xs] = chars
+        self.fore[ys, xs] = colors
+        self.glyph_mask[ys, xs] = True
+
+    def blit(self, x, y, back=None, fore=None, char=None):
+        ''' paints the background and/or the glyphs of a rect of cells from (x, y), its top left corner,
+            with arrays of the shape of the rect.
+        '''
+        shape = (back if back is not None else char).shape[:2]
+        cells = (slice(y, y + shape[0]), slice(x, x + shape[1]))
+        if back is not None:
+            self.back[cells] = back
+            self.back_mask[cells] = True
+        if char is not None:
+            self.char[cells] = char
+            self.fore[cells] = fore
+            self.glyph_mask[cells] = True
+
+    def update(self):
+        ''' draws the layer again if its inputs changed, returns true if it did '''
+        inputs = None
+        if self.inputs is not None:
+            inputs = self.inputs()
+            if not _same(inputs, self.drawn_from):
+                self.dirty = True
+        else:
+            self.dirty = True
+
+        if not self.dirty:
+            return False
+
+        self.clear()
+        self.draw(self)
+        self.drawn_from = inputs
+        self.dirty = False
+        return True
+
+
+class Compositor:
+
+    ''' Merges a stack of Layers, listed bottom first, into a single frame '''
+
+    def __init__(self, width, height, layers=()):
+        self.width = width
+        self.height = height
+        self.layers = list(layers)
+
+        self.back = numpy.zeros((height, width, 3), numpy.uint8)
+        self.fore = numpy.zeros((height, width, 3), numpy.uint8)
+        self.char = numpy.full((height, width), BLANK, numpy.int32)
+
+    def layer(self, name):
+        return next(layer for layer in self.layers if layer.name == name)
+
+    def compose(self):
+        ''' updates every layer and merges them, returns true if the frame changed '''
+        changed = [layer.update() for layer in self.layers]
+        if not any(changed):
+            return False
+
+        self.back[:] = 0
+        self.fore[:] = 0
+        self.char[:] = BLANK
+        for layer in self.layers:
+            numpy.copyto(self.back, layer.back, where=layer.back_mask[..., None])
+            numpy.copyto(self.fore, layer.fore, where=layer.glyph_mask[..., None])
+            numpy.copyto(self.char, layer.char, where=layer.glyph_mask)
+        return True
+
+
+class ScrollBuffer:
+
+    ''' Values computed per location of a view of width * height locations, such as the
+        palette ids of its tiles, indexed [screen y, screen x] like a Layer.
+        rasterize(rect) returns the values of the locations of a Rect as an array of the
+        same layout. Moving the view moves the values already computed in place and only
+        rasterizes the rows and columns it exposes, a step costs O(width + height) calls.
+    '''
+
+    def __init__(self, width, height, rasterize, dtype=numpy.intp):
+        self.width = width
+        self.height = height
+        self.rasterize = rasterize
+        self.values = numpy.zeros((height, width), dtype)
+
+        # the bottom left location of the view, None until it is first rasterized
+        self.corner = None
+
+    def invalidate(self):
+        self.corner = None
+
+    def refresh(self, rect):
+        ''' rasterizes the locations of rect inside the view again, after they changed '''
+        if self.corner is None:
+            return
+        x1, y1 = max(rect.x1, self.corner[0]), max(rect.y1, self.corner[1])
+        x2, y2 = min(rect.x2, self.corner[0] + self.width), min(rect.y2, self.corner[1] + self.height)
+        if x1 < x2 and y1 < y2:
+            self._rasterize(x1, y1, x2, y2)
+
+    def move(self, corner):
+        ''' moves the view to its new bottom left location corner and returns the values '''
+        corner = tuple(corner)
+        if self.corner == corner:
+            return self.values
+
+        if self.corner is None:
+            dx, dy = self.width, self.height
+        else:
+            dx, dy = corner[0] - self.corner[0], corner[1] - self.corner[1]
+        self.corner = corner
+
+        if abs(dx) >= self.width or abs(dy) >= self.height:
+            self._rasterize(corner[0], corner[1], corner[0] + self.width, corner[1] + self.height)
+            return self.values
+
+        # moving the view right moves the values left, moving it up moves them down the screen
+        width, height = self.width - abs(dx), self.height - abs(dy)
+        target = (slice(max(dy, 0), max(dy, 0) + height), slice(max(-dx, 0), max(-dx, 0) + width))
+        source = (slice(max(-dy, 0), max(-dy, 0) + height), slice(max(dx, 0), max(dx, 0) + width))
+        self.values[target] = self.values[source]
+
+        x1, y1 = corner
+        x2, y2 = x1 + self.width, y1 + self.height
+        if dx > 0:
+            self._rasterize(x2 - dx, y1, x2, y2)
+        elif dx < 0:
+            self._rasterize(x1, y1, x1 - dx, y2)
+        if dy > 0:
+            self._rasterize(x1, y2 - dy, x2, y2)
+        elif dy < 0:
+            self._rasterize(x1, y1, x2, y1 - dy)
+        return self.values
+
+    def _rasterize(self, x1, y1, x2, y2):
+        # rasterizes the locations from (x1, y1) to (x2, y2) excluded into their screen cells
+        top = self.corner[1] + self.height - y2
+        left = x1 - self.corner[0]
+        self.values[top:top + y2 - y1, left:left + x2 - x1] = self.rasterize(utils.Rect(x1, y1, x2 - x1, y2 - y1))
@@ -1,5 +1,7 @@
 from . import utils
 from . import objects
+from . import speculative
+from . import camera
 
 START = (0, 0)
 STARTING_LIFE = 10
@@ -15,16 +17,35 @@ class RoughLightGame:
         self.height = height
 
         self.objects = kwargs.get('objects', list())
-        self.start = kwargs.get('start', utils.Vector(0, 0))
+
+        # the view following the player, paged a screen at a time by default
+        self.camera = kwargs.get('camera', camera.Camera(width, height, centered=False))
+        self.start = kwargs.get('start', utils.Point(0, 0))
 
         # player initialization
         self.player = kwargs.get('player', None)
         if not self.player:
-            self.player = objects.Player(self.start, b'@', WHITE,
+            self.player = objects.Player(utils.Point(*self.start), b'@', WHITE,
                                          self.map, STARTING_LIFE, fov=20)
 
         self.objects.append(self.player)
 
+        # with speculative set, precompute the FOV of the player's next step on a background thread
+        self.speculative = None
+        if kwargs.get('speculative', False):
+            self.speculative = speculative.SpeculativeFov(self.map)
+            self.player.speculative = self.speculative
+            self.speculative.schedule(self.player)
+
+        # optional lighting.Lighting of the map and a light carried by the player
+        self.lighting = kwargs.get('lighting', None)
+        self.player_light = kwargs.get('player_light', None)
+        if self.player_light:
+            self.player_light.location = self.player.location
+
+        # optional particles.Particles for visual effects, kept out of objects
+        self.particles = kwargs.get('particles', None)
+
         # Add room lables to map
         count = 0
         for room in self.map.rooms:
@@ -33,7 +54,7 @@ class RoughLightGame:
             count += 1
 
     def is_blocked(self, location):
-        if self.map[location].blocks:
+        if not self.map.is_walkable(*location):
             return True
 
         return any(object.location == location and object.blocks for object in self.objects)
@@ -43,21 +64,37 @@ class RoughLightGame:
         res = []
         for object in self.objects:
             if object.visible and object.location in self.player.seen:
-                if self.map.in_area(self.width, self.height, object.location, self.player.location):
+                if self.camera.in_view(object.location, self.player.location):
                     res.append(object)
         return reversed(res)
                 
 
+    def update(self, dt):
+        # Advances the effects that don't wait for the player by dt seconds
+        if self.particles is not None:
+            self.particles.update(dt)
+
     def move_player(self, direction):
         if not self.is_blocked(self.player.location + direction):
             self.player.move(direction)
+            if self.speculative:
+                self.speculative.schedule(self.player)
+            if self.player_light:
+                self.player_light.location = self.player.location
 
     def is_blocked(self, location):
-        if self.map[location].blocks:
+        if not self.map.is_walkable(*location):
             return True
 
         return any(object.blocks and object.location == location for object in self.objects)
 
+    def close(self):
+        # Stops the background work of the game
+        if self.speculative:
+            self.speculative.close()
+            self.player.speculative = None
+            self.speculative = None
+
     def get_area(self, width, height):
         # Get the current area the player is in based on desired size and players location
         return self.map.get_area(width, height, self.player.location)
@@ -0,0 +1,113 @@
+import math
+import queue
+import threading
+from types import SimpleNamespace
+
+try:
+    from . import raycast as rc
+except ImportError:
+    import raycast as rc
+
+# the cells a viewer can move to in a single step
+NEIGHBOURS = ((0, 1), (0, -1), (-1, 0), (1, 0))
+
+
+class SpeculativeFov:
+
+    ''' Computes the field of view of the cells a viewer is likely to step to next
+        on a background thread, so the next move finds its FOV already computed.
+        Visible cells are kept as packed int keys (see utils.pack), as Player expects them.
+        Results are only valid for the map version they were computed at,
+        any edit to the map discards them.
+    '''
+
+    def __init__(self, game_map, directions=NEIGHBOURS, size=8):
+        self.map = game_map
+        self.directions = directions
+        self.size = size
+
+        # key -> visible cells, see SpeculativeFov.key
+        self.cache = {}
+        self.version = self.map.version
+        self.lock = threading.Lock()
+
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def key(location, facing, fov_angle, distance):
+        ''' returns the cache key of a field of view, facing doesn't matter for full circles '''
+        if fov_angle >= rc.CIRCLE:
+            facing = None
+        return (tuple(location), facing, fov_angle, distance)
+
+    def schedule(self, viewer):
+        ''' replaces the pending work with the FOV of every walkable neighbour of viewer '''
+        self._drain()
+
+        fov_angle = getattr(viewer, 'fov_angle', rc.CIRCLE)
+        version = self.map.version
+
+        for direction in self.directions:
+            location = (viewer.location[0] + direction[0], viewer.location[1] + direction[1])
+            if not self.map.is_walkable(*location):
+                continue
+
+            # creatures turn towards the direction they move in, see Creature.face
+            facing = math.atan2(direction[0], direction[1])
+            key = self.key(location, facing, fov_angle, viewer.fov)
+            with self.lock:
+                if key in self.cache:
+                    continue
+
+            viewpoint = SimpleNamespace(location=location, facing=facing, fov_angle=fov_angle)
+            self.jobs.put((version, key, viewpoint, viewer.fov))
+
+    def take(self, viewer):
+        ''' returns the precomputed visible cells of viewer as it is now, or None '''
+        key = self.key(viewer.location, getattr(viewer, 'facing', 0),
+                       getattr(viewer, 'fov_angle', rc.CIRCLE), viewer.fov)
+        with self.lock:
+            self._check_version()
+            return self.cache.get(key)
+
+    def close(self):
+        ''' stops the background thread and waits for it to finish '''
+        self._drain()
+        self.jobs.put(None)
+        self.thread.join()
+
+    def _check_version(self):
+        # drops every result computed for an older version of the map, the lock must be held
+        if self.map.version != self.version:
+            self.cache.clear()
+            self.version = self.map.version
+
+    def _drain(self):
+        try:
+            while True:
+                self.jobs.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+
+            version, key, viewpoint, distance = job
+            if version != self.map.version:
+                continue
+
+            visible = rc.cast_rays(viewpoint, self.map, distance, packed=True)
+
+            with self.lock:
+                self._check_version()
+                # the map may have changed while the rays were cast
+                if version != self.version:
+                    continue
+                self.cache[key] = visible
+                while len(self.cache) > self.size:
+                    del self.cache[next(iter(self.cache))]
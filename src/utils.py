@@ -1,5 +1,30 @@
 
 import math
+from operator import itemgetter
+
+# maps are split into square chunks of CHUNK_SIZE locations per side for change tracking
+CHUNK_SHIFT = 5
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+
+def chunk_key(location):
+    ''' returns the (x, y) index of the chunk holding location '''
+    return (location[0] >> CHUNK_SHIFT, location[1] >> CHUNK_SHIFT)
+
+# locations are packed into a single int as y * 2**32 + x, coordinates must fit in 32 signed bits.
+# Packed keys sort row by row and cost a fraction of the memory of an (x, y) tuple.
+PACK_SHIFT = 32
+PACK_OFFSET = 1 << (PACK_SHIFT - 1)
+PACK_MASK = (1 << PACK_SHIFT) - 1
+
+def pack(location):
+    ''' returns the packed int key of an (x, y) location '''
+    x, y = location
+    return (y << PACK_SHIFT) + x
+
+def unpack(key):
+    ''' returns the Point location of a packed int key '''
+    x = ((key + PACK_OFFSET) & PACK_MASK) - PACK_OFFSET
+    return Point(x, (key - x) >> PACK_SHIFT)
 
 class Vector(tuple):
     def __new__(cls, *args):
@@ -58,6 +83,93 @@ class Vector(tuple):
     def to_float(self):
         return Vector(*(float(v) for v in self))
 
+class Point(tuple):
+    ''' A 2D vector of exactly two coordinates, a faster Vector for locations and steps.
+        Points are (x, y) tuples underneath, so they hash and compare equal to plain tuples.
+    '''
+    __slots__ = ()
+
+    def __new__(cls, x, y):
+        return tuple.__new__(cls, (x, y))
+
+    x = property(itemgetter(0))
+    y = property(itemgetter(1))
+
+    def __add__(self, other):
+        return tuple.__new__(Point, (self[0] + other[0], self[1] + other[1]))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return tuple.__new__(Point, (self[0] - other[0], self[1] - other[1]))
+
+    def __rsub__(self, other):
+        return tuple.__new__(Point, (other[0] - self[0], other[1] - self[1]))
+
+    def __mul__(self, scalar):
+        return tuple.__new__(Point, (self[0] * scalar, self[1] * scalar))
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return tuple.__new__(Point, (-self[0], -self[1]))
+
+    def __repr__(self):
+        return "Point({}, {})".format(self[0], self[1])
+
+    def magnitude(self):
+        ''' returns the length of the vector '''
+        return math.hypot(self[0], self[1])
+
+class LocationSet:
+    ''' A set of (x, y) locations, stored as packed int keys (see pack).
+        Membership tests and iteration work with tuples, keys holds the packed set itself.
+    '''
+    __slots__ = ('keys',)
+
+    def __init__(self, locations=(), keys=None):
+        self.keys = set(map(pack, locations)) if keys is None else keys
+
+    def __contains__(self, location):
+        x, y = location
+        return (y << PACK_SHIFT) + x in self.keys
+
+    def __iter__(self):
+        return map(unpack, self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __eq__(self, other):
+        if isinstance(other, LocationSet):
+            return self.keys == other.keys
+        return self.keys == set(map(pack, other))
+
+    def __or__(self, other):
+        return LocationSet(keys=self.keys | LocationSet._keys(other))
+
+    def __sub__(self, other):
+        return LocationSet(keys=self.keys - LocationSet._keys(other))
+
+    def __and__(self, other):
+        return LocationSet(keys=self.keys & LocationSet._keys(other))
+
+    def __repr__(self):
+        return "LocationSet({})".format(sorted(self))
+
+    @staticmethod
+    def _keys(locations):
+        if isinstance(locations, LocationSet):
+            return locations.keys
+        return set(map(pack, locations))
+
+    def add(self, location):
+        x, y = location
+        self.keys.add((y << PACK_SHIFT) + x)
+
+    def update(self, locations):
+        self.keys.update(LocationSet._keys(locations))
+
 class Rect():
     ''' defines a rectangular shape. '''
     def __init__(self, x, y, w, h):
@@ -83,7 +195,30 @@ class Rect():
                 self.y1 <= other.y1 and
                 self.y2 >= other.y2)
 
+    def union(self, other):
+        ''' returns the smallest rect containing both self and other. '''
+        x1 = min(self.x1, other.x1)
+        y1 = min(self.y1, other.y1)
+        return Rect(x1, y1, max(self.x2, other.x2) - x1, max(self.y2, other.y2) - y1)
+
     def get_center(self):
         return (self.x1 + (self.x2 - self.x1) // 2,
                 self.y1 + (self.y2 - self.y1) // 2)
 
+
+if __name__ == '__main__':
+
+    # microbenchmarks of Point against Vector
+    import timeit
+
+    for cls in (Vector, Point):
+        a, b = cls(3, 4), cls(1, -1)
+        grid = {(x, y): None for x in range(100) for y in range(100)}
+        results = {
+            'new': timeit.timeit(lambda: cls(3, 4), number=200000),
+            'add': timeit.timeit(lambda: a + b, number=200000),
+            'sub': timeit.timeit(lambda: a - b, number=200000),
+            'hash': timeit.timeit(lambda: hash(a), number=200000),
+            'lookup': timeit.timeit(lambda: (a + b) in grid, number=200000),
+        }
+        print(cls.__name__, ' '.join('{}: {:.1f}ns'.format(name, 1e9 * t / 200000) for name, t in results.items()))
@@ -0,0 +1,151 @@
+''' Field of view of many viewers at once on a pool of worker processes.
+    The opacity of the map is published into shared memory once per map version,
+    workers attach to it by name and send every field of view back as a bitmask,
+    so no map data is pickled per request.
+'''
+
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from types import SimpleNamespace
+
+try:
+    from . import utils
+    from . import raycast as rc
+except ImportError:
+    import utils
+    import raycast as rc
+
+
+class FovMask:
+
+    ''' The field of view of a viewer as a bitmask over the square rect around it,
+        one bit per location, row by row starting at the bottom left corner.
+    '''
+
+    def __init__(self, rect, bits):
+        self.rect = rect
+        self.bits = bits
+
+    def __contains__(self, location):
+        x, y = location
+        rect = self.rect
+        if not (rect.x1 <= x < rect.x2 and rect.y1 <= y < rect.y2):
+            return False
+        i = (y - rect.y1) * (rect.x2 - rect.x1) + x - rect.x1
+        return bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def __iter__(self):
+        width = self.rect.x2 - self.rect.x1
+        for index, byte in enumerate(self.bits):
+            while byte:
+                bit = (byte & -byte).bit_length() - 1
+                i = (index << 3) + bit
+                yield (self.rect.x1 + i % width, self.rect.y1 + i // width)
+                byte &= byte - 1
+
+
+class VisibilityService:
+
+    ''' Computes the FOV of many viewers across a process pool.
+        Only the opacity inside bounds is published, everything outside it blocks sight.
+    '''
+
+    def __init__(self, game_map, bounds, processes=None):
+        self.map = game_map
+        self.bounds = bounds
+
+        # workers must share our resource tracker, or their own would unlink the blocks they attached to
+        resource_tracker.ensure_running()
+        self.pool = multiprocessing.Pool(processes)
+        self.memory = None
+        self.version = None
+
+    def publish(self):
+        ''' copies the opacity inside bounds into a new shared memory block if the map changed '''
+        if self.memory is not None and self.version == self.map.version:
+            return
+
+        self.version = self.map.version
+        opacity = self.map.opacity_window(self.bounds)
+
+        memory = shared_memory.SharedMemory(create=True, size=len(opacity))
+        memory.buf[:len(opacity)] = opacity
+
+        self._release()
+        self.memory = memory
+
+    def compute(self, viewers):
+        ''' returns a FovMask for every viewer, viewers need a location and fov like Player '''
+        self.publish()
+
+        bounds = (self.bounds.x1, self.bounds.y1, self.bounds.x2, self.bounds.y2)
+        jobs = [(self.memory.name, bounds, tuple(viewer.location), getattr(viewer, 'facing', 0),
+                 getattr(viewer, 'fov_angle', rc.CIRCLE), viewer.fov) for viewer in viewers]
+
+        return [FovMask(utils.Rect(*rect), bits) for rect, bits in self.pool.map(_compute_fov, jobs)]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self._release()
+
+    def _release(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+class _SharedOpacity:
+
+    ''' Stands in for a Map inside the workers, reading opacity from the shared block '''
+
+    def __init__(self, memory, bounds):
+        self.memory = memory
+        self.bounds = utils.Rect(bounds[0], bounds[1], bounds[2] - bounds[0], bounds[3] - bounds[1])
+
+    def opacity_window(self, rect):
+        # same layout as Map.opacity_window, locations outside bounds are opaque
+        width = rect.x2 - rect.x1
+        window = bytearray(b'\x01') * (width * (rect.y2 - rect.y1))
+
+        bounds = self.bounds
+        bounds_width = bounds.x2 - bounds.x1
+        left, right = max(rect.x1, bounds.x1), min(rect.x2, bounds.x2)
+        if left >= right:
+            return window
+
+        for y in range(max(rect.y1, bounds.y1), min(rect.y2, bounds.y2)):
+            source = (y - bounds.y1) * bounds_width + left - bounds.x1
+            target = (y - rect.y1) * width + left - rect.x1
+            window[target:target + right - left] = self.memory.buf[source:source + right - left]
+        return window
+
+
+# the shared memory block attached in this worker process
+_attached = {}
+
+
+def _compute_fov(job):
+    ''' Worker for VisibilityService.compute, returns the rect and bits of a FovMask '''
+    name, bounds, location, facing, fov_angle, distance = job
+
+    if name not in _attached:
+        for memory in _attached.values():
+            memory.close()
+        _attached.clear()
+        _attached[name] = shared_memory.SharedMemory(name=name)
+
+    opacity = _SharedOpacity(_attached[name], bounds)
+
+    reach = int(distance) + 1
+    rect = utils.Rect(location[0] - reach, location[1] - reach, 2 * reach + 1, 2 * reach + 1)
+    width = rect.x2 - rect.x1
+    bits = bytearray((width * width + 7) // 8)
+
+    viewer = SimpleNamespace(location=location, facing=facing, fov_angle=fov_angle)
+    for x, y in rc.cast_rays(viewer, opacity, distance):
+        i = (y - rect.y1) * width + x - rect.x1
+        bits[i >> 3] |= 1 << (i & 7)
+
+    return (rect.x1, rect.y1, width, width), bytes(bits)